@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import uuid
+
+import numpy as np
+
+# the cache is enabled by setting the directory, the environment is inherited by the loader worker processes
+CACHE_DIR_ENV = 'AUC_CACHE_DIR'
+CACHE_SIZE_ENV = 'AUC_CACHE_SIZE_MB'
+DEFAULT_CACHE_SIZE_MB = 10240
+# bytes hashed from the start and the end of a file for its fingerprint
+SAMPLE_SIZE = 1 << 16
+# layout of the cached arrays, increase it whenever the decoding of read_auc changes, older entries are then misses
+CACHE_VERSION = 1
+
+
+def fingerprint(filename: str) -> str:
+    """Fingerprint of a file built from its path, size, mtime and a hash of its first and last bytes"""
+    path = pathlib.Path(filename).resolve()
+    stat = path.stat()
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{path}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(SAMPLE_SIZE))
+        if stat.st_size > SAMPLE_SIZE:
+            f.seek(max(SAMPLE_SIZE, stat.st_size - SAMPLE_SIZE))
+            digest.update(f.read(SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+class AucCache:
+    """On-disk cache of decoded auc files, stored as memory-mappable .npy files with size capped LRU eviction
+
+    Every entry is a directory named by the fingerprint of the source file and CACHE_VERSION, holding a meta.json
+    with the scalar header values and one .npy file per array.
+    """
+
+    def __init__(self, directory, max_bytes: int = DEFAULT_CACHE_SIZE_MB << 20):
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def entry(self, filename: str) -> pathlib.Path:
+        """Directory of the entry of a file"""
+        return self.directory / f'{fingerprint(filename)}.v{CACHE_VERSION}'
+
+    def get(self, filename: str) -> tuple[dict, dict] | None:
+        """Return the cached meta data and memory mapped arrays of a file or None if it isn't cached"""
+        entry = self.entry(filename)
+        try:
+            with open(entry / 'meta.json') as f:
+                meta = json.load(f)
+            if meta.pop('cache_version', None) != CACHE_VERSION:
+                return None
+            arrays = {name: np.load(entry / f'{name}.npy', mmap_mode='r') for name in meta.pop('arrays')}
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+        # mark the entry as recently used
+        os.utime(entry)
+        return meta, arrays
+
+    def put(self, filename: str, meta: dict, arrays: dict):
+        """Store the meta data and arrays of a decoded file and evict the least recently used entries"""
+        entry = self.entry(filename)
+        if entry.exists():
+            return
+        # write into a temporary directory first, so concurrent readers never see a partial entry
+        tmp = self.directory / f'.tmp-{uuid.uuid4().hex}'
+        tmp.mkdir()
+        arrays = {name: array for name, array in arrays.items() if array is not None}
+        for name, array in arrays.items():
+            np.save(tmp / f'{name}.npy', array)
+        with open(tmp / 'meta.json', 'w') as f:
+            json.dump(dict(meta, arrays=list(arrays), cache_version=CACHE_VERSION), f)
+        try:
+            tmp.rename(entry)
+        except OSError:
+            # another process stored the same file in the meantime
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits into max_bytes"""
+        entries = []
+        for entry in self.directory.iterdir():
+            if entry.name.startswith('.tmp-'):
+                continue
+            try:
+                size = sum(file.stat().st_size for file in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except FileNotFoundError:
+                # evicted by another process in the meantime
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """Remove all entries"""
+        for entry in self.directory.iterdir():
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+_cache = None
+
+
+def get_cache() -> AucCache | None:
+    """Return the configured cache or None if caching is disabled"""
+    global _cache
+    directory = os.getenv(CACHE_DIR_ENV)
+    if not directory:
+        return None
+    max_bytes = int(float(os.getenv(CACHE_SIZE_ENV, DEFAULT_CACHE_SIZE_MB)) * (1 << 20))
+    if _cache is None or _cache.directory != pathlib.Path(directory) or _cache.max_bytes != max_bytes:
+        _cache = AucCache(directory, max_bytes)
+    return _cache
+
+
+def enable_cache(directory, max_size_mb: float = DEFAULT_CACHE_SIZE_MB):
+    """Enable the cache for this process and the worker processes started from it"""
+    os.environ[CACHE_DIR_ENV] = str(directory)
+    os.environ[CACHE_SIZE_ENV] = str(max_size_mb)
+
+
+def disable_cache():
+    """Disable the cache for this process and the worker processes started from it"""
+    os.environ.pop(CACHE_DIR_ENV, None)
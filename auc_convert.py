@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import pathlib
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from auc_cache import fingerprint
+from auc_run import find_auc_files
+from read_auc import AucFile
+from write_mw import write_mw
+from write_mwrs import write_mwrs
+
+FORMATS = ('mw', 'mwrs')
+MANIFEST_VERSION = 1
+
+
+def group_auc_files(directory) -> dict[tuple, list[dict]]:
+    """Metadata of the auc files of a directory grouped by (runID, cell, channel) and sorted by wavelength"""
+    groups = {}
+    for metadata in find_auc_files(directory):
+        groups.setdefault((metadata['runID'], metadata['cell'], metadata['channel']), []).append(metadata)
+    return {key: sorted(files, key=lambda metadata: metadata['wavelength']) for key, files in sorted(groups.items())}
+
+
+# scan meta data averaged over the wavelengths of a merged scan
+SCAN_FIELDS = ('temperature', 'omega2t', 'seconds', 'rpm', 'delta_r')
+
+
+def radius_grid(files: list[AucFile]) -> dict:
+    """Common radius grid of the wavelengths of a group, averaged from their headers"""
+    min_radius = np.mean([auc.header['min_radius'] for auc in files])
+    delta_r = np.mean([auc.header['delta_radius'] for auc in files])
+    max_radius = np.mean([auc.header['min_radius'] + auc.header['delta_radius'] * (auc.scans[-1]['value_count'] - 1)
+                          for auc in files])
+    count = int(round((max_radius - min_radius) / delta_r)) + 1 if delta_r else 1
+    return {'min_radius': float(min_radius), 'max_radius': float(min_radius + delta_r * (count - 1)),
+            'delta_r': float(delta_r), 'count': count}
+
+
+def interpolation_weights(grid: dict, min_radius: float, delta_radius: float,
+                          value_count: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Indices of the left and right neighbours and the weight of the right one for resampling a scan onto grid
+
+    Grid points outside the radius range of the scan take its first or last reading.
+    """
+    position = (grid['min_radius'] + grid['delta_r'] * np.arange(grid['count']) - min_radius) / delta_radius
+    # readings on the same grid are copied exactly instead of mixing in a rounding error of their neighbour
+    nearest = np.rint(position)
+    position = np.where(np.abs(position - nearest) < 1e-6, nearest, position)
+    position = np.clip(position, 0, value_count - 1)
+    left = np.floor(position).astype(np.intp)
+    right = np.minimum(left + 1, value_count - 1)
+    return left, right, position - left
+
+
+def iter_merged_scans(files: list[AucFile], grid: dict):
+    """Yield the scans with the same index of all wavelengths merged onto the common radius grid
+
+    Only the scan of the current index is decoded from every wavelength, so the memory needed is bounded by one scan
+    per wavelength. The interpolation weights are computed once per wavelength and value count, every scan is then
+    resampled with one gather over the stacked readings. The meta data of all scans is averaged upfront from the scan
+    headers. Every merged scan holds the averaged meta data, the wavelengths and the (wavelength, radius) readings.
+    """
+    scan_count = max(len(auc) for auc in files)
+    meta = np.full((len(files), scan_count, len(SCAN_FIELDS)), np.nan)
+    for i, auc in enumerate(files):
+        meta[i, :len(auc)] = [[scan[name] for name in SCAN_FIELDS] for scan in auc.scans]
+    averages = np.nanmean(meta, axis=0)
+    weights = {}
+    for x in range(scan_count):
+        present = [i for i, auc in enumerate(files) if x < len(auc)]
+        scans = [files[i][x] for i in present]
+        value_counts = [len(scan['reading_values']) for scan in scans]
+        stacked = np.zeros((len(scans), max(value_counts)))
+        left = np.empty((len(scans), grid['count']), dtype=np.intp)
+        right = np.empty_like(left)
+        fraction = np.empty(left.shape)
+        for row, (i, scan, value_count) in enumerate(zip(present, scans, value_counts)):
+            stacked[row, :value_count] = scan['reading_values']
+            key = (i, value_count)
+            if key not in weights:
+                weights[key] = interpolation_weights(grid, files[i].header['min_radius'],
+                                                     files[i].header['delta_radius'], value_count)
+            left[row], right[row], fraction[row] = weights[key]
+        rows = np.arange(len(scans))[:, None]
+        readings = stacked[rows, left] * (1.0 - fraction) + stacked[rows, right] * fraction
+        merged = dict(zip(SCAN_FIELDS, averages[x].tolist()))
+        merged.update({'reading_count': grid['count'], 'wavelengths': [int(scan['wavelength']) for scan in scans],
+                       'readings': readings})
+        yield merged
+
+
+def _write_mw(f, run_id: str, cell: int, channel: str, x: int, description: str, grid: dict, scan: dict):
+    write_mw(1234, 1711494000, 11060, int(cell), channel, x + 1, description, int(round(scan['rpm'])),
+             scan['temperature'], scan['omega2t'], int(round(scan['seconds'])), int(scan['reading_count']),
+             grid['min_radius'] * 10.0, grid['max_radius'] * 10.0, scan['wavelengths'], scan['readings'], out=f)
+
+
+def _write_mwrs(f, run_id: str, cell: int, channel: str, x: int, description: str, grid: dict, scan: dict):
+    write_mwrs(int(cell), channel, x + 1, int(round(scan['rpm'])), int(round(scan['rpm'])),
+               int(round(scan['temperature'])), scan['omega2t'], int(round(scan['seconds'])), grid['min_radius'],
+               grid['delta_r'], scan['wavelengths'], int(scan['reading_count']), scan['readings'], out=f)
+
+
+def output_name(format: str, run_id: str, cell: int, channel: str, x: int) -> str:
+    """Filename of the converted scan with the index x"""
+    if format == 'mw':
+        return f"{channel}{x + 1:03}.MW{cell}"
+    return f"{run_id}.{cell}.{channel}.sample.{x + 1:03}.{format}"
+
+
+def convert_group(key: tuple, paths: list[str], output_dir: str, format: str = 'mw') -> dict:
+    """Convert the auc files of one (runID, cell, channel) group, one file per wavelength
+
+    Runs in a worker process, which writes the scans of the group directly into output_dir and returns the
+    throughput statistics of the group. The files are memory mapped and merged one scan index at a time, so the
+    memory used doesn't grow with the number of scans.
+    """
+    start = time.perf_counter()
+    run_id, cell, channel = key
+    files = [AucFile(path) for path in paths]
+    writer = _write_mw if format == 'mw' else _write_mwrs
+    description = files[-1].header['description']
+    grid = radius_grid(files)
+    outputs = []
+    for x, scan in enumerate(iter_merged_scans(files, grid)):
+        filename = pathlib.Path(output_dir) / output_name(format, run_id, cell, channel, x)
+        with open(filename, 'wb') as f:
+            writer(f, run_id, cell, channel, x, description, grid, scan)
+        outputs.append(str(filename))
+    for auc in files:
+        auc.close()
+    return {
+        'group': key,
+        'inputs': len(paths),
+        'input_bytes': sum(os.path.getsize(path) for path in paths),
+        'outputs': outputs,
+        'output_bytes': sum(os.path.getsize(filename) for filename in outputs),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def report(stats: dict):
+    """Print the throughput of a converted group"""
+    run_id, cell, channel = stats['group']
+    seconds = max(stats['seconds'], 1e-9)
+    print(f"{run_id} cell {cell} channel {channel}: {stats['inputs']} wavelengths to {len(stats['outputs'])} scans, "
+          f"{stats['input_bytes'] / 1e6:.1f} MB in {stats['seconds']:.2f} s ({stats['input_bytes'] / 1e6 / seconds:.1f} MB/s)")
+
+
+class Manifest:
+    """Fingerprints of the inputs and names of the outputs of every converted group, stored next to the outputs
+
+    A group only has to be converted again if its inputs changed or one of its outputs is missing.
+    """
+
+    def __init__(self, output_dir, format: str):
+        self.path = pathlib.Path(output_dir) / f'.auc_convert.{format}.manifest.json'
+        self.groups = {}
+        try:
+            with open(self.path) as f:
+                manifest = json.load(f)
+            if manifest.get('version') == MANIFEST_VERSION:
+                self.groups = manifest['groups']
+        except (FileNotFoundError, ValueError):
+            pass
+
+    @staticmethod
+    def key(group: tuple) -> str:
+        return '|'.join(str(part) for part in group)
+
+    def is_current(self, group: tuple, inputs: dict[str, str]) -> bool:
+        """Whether the group was converted from exactly these inputs and all its outputs still exist"""
+        entry = self.groups.get(self.key(group))
+        return (entry is not None and entry['inputs'] == inputs
+                and all((self.path.parent / name).exists() for name in entry['outputs']))
+
+    def update(self, group: tuple, inputs: dict[str, str], outputs: list[str]):
+        """Record a converted group and remove the outputs of its previous conversion which weren't written again"""
+        outputs = [pathlib.Path(filename).name for filename in outputs]
+        entry = self.groups.get(self.key(group))
+        self.groups[self.key(group)] = {'inputs': inputs, 'outputs': outputs}
+        if entry is not None:
+            self._remove(set(entry['outputs']) - set(outputs))
+
+    def prune(self, groups) -> int:
+        """Remove the outputs and entries of groups which are no longer in the input directory"""
+        keep = {self.key(group) for group in groups}
+        stale = [key for key in self.groups if key not in keep]
+        for key in stale:
+            self._remove(self.groups.pop(key)['outputs'])
+        return len(stale)
+
+    def _remove(self, names):
+        # mw filenames don't contain the runID, keep outputs written by another group
+        claimed = {name for entry in self.groups.values() for name in entry['outputs']}
+        for name in set(names) - claimed:
+            (self.path.parent / name).unlink(missing_ok=True)
+
+    def save(self):
+        # replace the manifest atomically, so an interrupted conversion never leaves a truncated one
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'groups': self.groups}, f, indent=1)
+        os.replace(tmp, self.path)
+
+
+def convert_run(directory, output_dir=None, format: str = 'mw', workers: int | None = None,
+                force: bool = False) -> list[dict]:
+    """Convert all auc files of a directory to mw or mwrs files, one process pool task per (runID, cell, channel)
+
+    output_dir defaults to the input directory, workers to the number of CPUs. With one worker the groups are
+    converted in this process. Groups whose inputs are unchanged since the last conversion according to the manifest
+    in output_dir are skipped unless force is set, outputs of groups which no longer exist are removed.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if not os.path.isdir(directory):
+        raise ValueError(f"{directory} is not a directory")
+    output_dir = pathlib.Path(output_dir or directory)
+    groups = group_auc_files(directory)
+    manifest = Manifest(output_dir, format)
+    if not groups and not manifest.groups:
+        print(f"No auc files found in {directory}")
+        return []
+    output_dir.mkdir(parents=True, exist_ok=True)
+    removed = manifest.prune(groups)
+    if removed:
+        print(f"Removed the outputs of {removed} groups without inputs")
+    inputs = {key: {str(metadata['path']): fingerprint(metadata['path']) for metadata in files}
+              for key, files in groups.items()}
+    tasks = [(key, list(inputs[key]), str(output_dir), format) for key in groups
+             if force or not manifest.is_current(key, inputs[key])]
+    if len(tasks) < len(groups):
+        print(f"Skipping {len(groups) - len(tasks)} unchanged groups")
+    workers = min(workers or os.cpu_count() or 1, max(len(tasks), 1))
+    start = time.perf_counter()
+    results = []
+
+    def done(stats: dict):
+        results.append(stats)
+        manifest.update(stats['group'], inputs[stats['group']], stats['outputs'])
+        manifest.save()
+        report(stats)
+
+    if workers == 1:
+        for task in tasks:
+            done(convert_group(*task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(convert_group, *task) for task in tasks]
+            for future in as_completed(futures):
+                done(future.result())
+    manifest.save()
+    total = sum(stats['input_bytes'] for stats in results)
+    elapsed = time.perf_counter() - start
+    print(f"Converted {len(results)} groups, {total / 1e6:.1f} MB in {elapsed:.2f} s "
+          f"({total / 1e6 / max(elapsed, 1e-9):.1f} MB/s)")
+    return results
+
+
+def main(argv=None, format: str = 'mw'):
+    parser = argparse.ArgumentParser(description='Convert the auc files of a directory to mw or mwrs files.')
+    parser.add_argument('directory', type=str, help='Input directory with auc files')
+    parser.add_argument('-format', type=str, choices=FORMATS, default=format, help='Output format')
+    parser.add_argument('-output', type=str, help='Output directory, defaults to the input directory', required=False)
+    parser.add_argument('-workers', type=int, help='Number of worker processes', required=False)
+    parser.add_argument('-force', action='store_true', help='Convert unchanged groups again')
+    args = parser.parse_args(argv)
+    convert_run(args.directory, args.output, args.format, args.workers, args.force)
+
+
+if __name__ == '__main__':
+    main()
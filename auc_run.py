@@ -0,0 +1,90 @@
+import os
+import pathlib
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from read_auc import load_auc
+
+FILEPATTERN = re.compile(r"(?P<runID>[A-Za-z0-9-_]*)\.(?P<optic>[A-Z]*)\.(?P<cell>[0-9])\.(?P<channel>[A-Z])\.(?P<wavelength>[0-9]+)\.auc")
+
+
+def parse_auc_filename(filename: str) -> dict | None:
+    """Extract runID, optic, cell, channel and wavelength from an auc filename, None if it doesn't match"""
+    match = FILEPATTERN.match(filename)
+    if not match:
+        return None
+    return {
+        'runID': match.group('runID'),
+        'optic': match.group('optic'),
+        'cell': int(match.group('cell')),
+        'channel': match.group('channel'),
+        'wavelength': int(match.group('wavelength')),
+    }
+
+
+def find_auc_files(directory) -> list[dict]:
+    """Find all .auc files in the directory and extract their metadata from the filename"""
+    auc_files = sorted(pathlib.Path(directory).glob("*.auc"))
+    print(f"Found {len(auc_files)} .auc files")
+    found = []
+    for file_path in auc_files:
+        metadata = parse_auc_filename(file_path.name)
+        if metadata is None:
+            print(f"Skipping file {file_path.name} - doesn't match pattern")
+            continue
+        metadata['path'] = file_path
+        found.append(metadata)
+    return found
+
+
+class AucRunIndex:
+    """Loaded auc files of a directory keyed by (runID, cell, channel, wavelength)"""
+
+    def __init__(self):
+        self.files = {}
+        self.data = {}
+
+    def add(self, metadata: dict, data):
+        key = (metadata['runID'], metadata['cell'], metadata['channel'], metadata['wavelength'])
+        self.files[key] = metadata
+        self.data[key] = data
+
+    def __getitem__(self, key: tuple):
+        return self.data[key]
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self.data
+
+    def __iter__(self):
+        return iter(sorted(self.data))
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def groups(self) -> dict[tuple, dict]:
+        """Loaded data grouped by (runID, cell, channel) and sorted by wavelength"""
+        grouped = {}
+        for runID, cell, channel, wavelength in self:
+            grouped.setdefault((runID, cell, channel), {})[wavelength] = self.data[(runID, cell, channel, wavelength)]
+        return grouped
+
+
+def load_auc_run(directory, loader=load_auc, workers: int | None = None) -> AucRunIndex:
+    """Decode all auc files of a directory in parallel and index them by (runID, cell, channel, wavelength)
+
+    loader is called with the path of every file in a worker process, so it has to be a module level function. It may
+    also reduce a file to a smaller result, like calculate_reference_bfe does, instead of returning the decoded data.
+    workers defaults to the number of CPUs, with one worker the files are decoded in this process.
+    """
+    files = find_auc_files(directory)
+    workers = workers or os.cpu_count() or 1
+    paths = [str(metadata['path']) for metadata in files]
+    if workers == 1 or len(paths) < 2:
+        results = list(map(loader, paths))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+            results = list(executor.map(loader, paths, chunksize=max(1, len(paths) // (4 * workers))))
+    index = AucRunIndex()
+    for metadata, data in zip(files, results):
+        index.add(metadata, data)
+    return index
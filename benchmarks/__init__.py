@@ -0,0 +1 @@
+"""Benchmarks for the binary UltraScan format readers and writers"""
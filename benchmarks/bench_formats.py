@@ -0,0 +1,207 @@
+"""Time and memory benchmarks of the binary format readers and writers
+
+Every case runs in a freshly spawned process, so the peak RSS of one case isn't inflated by the previous ones.
+The results are written as JSON together with the commit they were measured on, compare two result files with
+--compare to see the change between commits.
+
+    python -m benchmarks.bench_formats --preset medium -o bench_output.json
+    python -m benchmarks.bench_formats --compare old.json new.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks import synthetic
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# (scans, radii) for auc, (wavelengths, radii) for mwrs and mw, records for tmst
+PRESETS = {
+    'small': {'auc': [(10, 500)], 'mwrs': [(1, 500)], 'mw': [(1, 500)], 'tmst': [3600]},
+    'medium': {'auc': [(200, 1600), (800, 1600)], 'mwrs': [(100, 1600)], 'mw': [(100, 1600)], 'tmst': [36000]},
+    'large': {'auc': [(2000, 3000)], 'mwrs': [(200, 3000)], 'mw': [(200, 3000)], 'tmst': [36000, 72000]},
+}
+
+
+def _peak_rss_mb() -> float | None:
+    """Peak resident set size of this process"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes everywhere else
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+
+def _prepare(case: dict, directory: pathlib.Path):
+    """Create the input file or arguments of a case and return the function call and the file it reads or writes"""
+    kind, function, size = case['kind'], case['function'], case['size']
+    if function == 'read_auc':
+        from read_auc import read_auc
+        path = directory / 'bench.auc'
+        synthetic.auc_file(path, *size)
+        return lambda: read_auc(str(path)), path
+    if function == 'write_auc':
+        from write_auc import write_auc
+        path = directory / 'bench.auc'
+        data = synthetic.auc_dict(*size)
+        return lambda: write_auc(str(path), data), path
+    if function == 'read_mwrs':
+        from read_mwrs import read_mwrs
+        path = directory / 'bench.mwrs'
+        synthetic.mwrs_file(path, *size)
+        return lambda: read_mwrs(str(path)), path
+    if function == 'write_mwrs':
+        from write_mwrs import write_mwrs
+        wavelengths, radii = size
+        intensity = synthetic.intensity_lists(wavelengths, radii)
+        lambdas = list(range(250, 250 + wavelengths))
+        return (lambda: write_mwrs(1, 'A', 1, 50000, 50000, 20.0, 1.5e10, 3600, 5.8, 0.001, lambdas, radii,
+                                   intensity)), None
+    if function == 'write_mw':
+        from write_mw import write_mw
+        wavelengths, radii = size
+        intensity = synthetic.intensity_lists(wavelengths, radii)
+        lambdas = list(range(250, 250 + wavelengths))
+        return (lambda: write_mw(1234, 1711494000, 11060, 1, 'A', 1, 'benchmark', 50000, 20.0, 1.5e10, 3600, radii,
+                                 5.8, 7.2, lambdas, intensity)), None
+    if function == 'read_mw':
+        from read_mw import read_mw
+        path = directory / 'bench.MW1'
+        synthetic.mw_file(path, *size)
+        # the intensities are memory mapped, copying them makes sure they are actually read
+        return lambda: np.array(read_mw(str(path))['intensity']), path
+    if function == 'read_tmst':
+        from read_tmst import read_tmst
+        path = directory / 'bench.tmst'
+        synthetic.tmst_file(path, size)
+        return lambda: read_tmst(str(path)), path
+    raise ValueError(f"Unknown benchmark {kind} {function}")
+
+
+def run_case(case: dict, repeat: int) -> dict:
+    """Run a single case, meant to be called in a fresh process"""
+    from auc_cache import disable_cache
+    # with AUC_CACHE_DIR set read_auc would measure cache hits instead of decoding
+    disable_cache()
+    result = dict(case)
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            call, path = _prepare(case, pathlib.Path(tmp))
+            rss_before = _peak_rss_mb()
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                output = call()
+                timings.append(time.perf_counter() - start)
+            # writers without a file return their payload
+            size = path.stat().st_size if path is not None else len(output)
+            del output
+            rss_after = _peak_rss_mb()
+            # allocation tracing slows the call down, so it is measured in a separate run
+            tracemalloc.start()
+            call()
+            peak_alloc = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        except Exception as e:
+            result['error'] = f"{type(e).__name__}: {e}"
+            return result
+    result.update({
+        'bytes': size,
+        'seconds': min(timings),
+        'mb_per_s': size / min(timings) / 1e6,
+        'peak_rss_mb': rss_after,
+        'rss_increase_mb': None if rss_after is None else rss_after - rss_before,
+        'peak_alloc_mb': peak_alloc / (1 << 20),
+    })
+    return result
+
+
+def _cases(preset: str) -> list[dict]:
+    cases = []
+    for kind, sizes in PRESETS[preset].items():
+        functions = {'auc': ('read_auc', 'write_auc'), 'mwrs': ('read_mwrs', 'write_mwrs'), 'mw': ('read_mw', 'write_mw'),
+                     'tmst': ('read_tmst',)}[kind]
+        for size in sizes:
+            for function in functions:
+                cases.append({'kind': kind, 'function': function, 'size': size,
+                              'name': f"{function}[{'x'.join(map(str, np.atleast_1d(size)))}]"})
+    return cases
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=pathlib.Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(preset: str, repeat: int, only: list[str] | None = None) -> dict:
+    """Run all cases of a preset, each in its own spawned process"""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for case in _cases(preset):
+        if only and case['function'] not in only:
+            continue
+        with context.Pool(1) as pool:
+            result = pool.apply(run_case, (case, repeat))
+        if 'error' in result:
+            print(f"{result['name']:<28} failed: {result['error']}", file=sys.stderr)
+        else:
+            print(f"{result['name']:<28} {result['seconds'] * 1000:10.2f} ms {result['mb_per_s']:10.1f} MB/s "
+                  f"peak alloc {result['peak_alloc_mb']:8.1f} MB", file=sys.stderr)
+        results.append(result)
+    return {
+        'commit': _commit(),
+        'preset': preset,
+        'repeat': repeat,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+
+
+def compare(old_file: str, new_file: str):
+    """Print the speedup and memory change of every case present in both result files"""
+    with open(old_file) as f:
+        old = {result['name']: result for result in json.load(f)['results'] if 'error' not in result}
+    with open(new_file) as f:
+        new = {result['name']: result for result in json.load(f)['results'] if 'error' not in result}
+    for name in sorted(old.keys() & new.keys()):
+        speedup = old[name]['seconds'] / new[name]['seconds']
+        memory = new[name]['peak_alloc_mb'] / old[name]['peak_alloc_mb'] if old[name]['peak_alloc_mb'] else float('nan')
+        print(f"{name:<28} speedup {speedup:8.2f}x   peak alloc {memory:6.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the binary format readers and writers')
+    parser.add_argument('--preset', choices=PRESETS, default='small', help='Size range of the synthetic files')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case, the fastest one is reported')
+    parser.add_argument('--only', nargs='+', help='Only run these functions, e.g. read_auc write_auc')
+    parser.add_argument('-o', '--output', help='JSON file to write the results to, default stdout')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two result files')
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+    report = run(args.preset, args.repeat, args.only)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
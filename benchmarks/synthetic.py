@@ -0,0 +1,84 @@
+"""Synthetic AUC, MWRS, MW and TMST files for the benchmarks
+
+The generators build the files directly from NumPy record arrays, independent of the readers and writers under test,
+and use fixed seeds so the same parameters always produce the same bytes.
+"""
+import struct
+
+import numpy as np
+
+
+def auc_file(path, scans: int, radii: int, stddev: bool = False, seed: int = 0):
+    """Write an auc file with scans x radii quantized readings"""
+    rng = np.random.default_rng(seed)
+    channels = 2 if stddev else 1
+    header = struct.pack('<4s2s2sBc16s240s7fh', b'UCDA', b'05', b'IP', 1, b'A', bytes(16), b'benchmark',
+                         5.8, 0.0, 0.001, -1.0, 4.0, 0.0 if not stddev else 0.001, 0.0 if not stddev else 0.1, scans)
+    records = np.zeros(scans, dtype=[('data', 'S4'), ('temperature', '<f4'), ('rpm', '<f4'), ('seconds', '<i4'),
+                                     ('omega2t', '<f4'), ('wavelength', '<i2'), ('delta_r', '<f4'),
+                                     ('value_count', '<i4'), ('values', '<u2', (radii * channels,)),
+                                     ('interpolated', 'u1', ((radii + 7) // 8,))])
+    records['data'] = b'DATA'
+    records['temperature'] = 20.0
+    records['rpm'] = 50000.0
+    records['seconds'] = 60 * np.arange(1, scans + 1)
+    records['omega2t'] = records['seconds'] * (50000 * np.pi / 30) ** 2
+    records['wavelength'] = 6750
+    records['delta_r'] = 0.001
+    records['value_count'] = radii
+    records['values'] = rng.integers(0, 65536, size=(scans, radii * channels), dtype=np.uint16)
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(records.tobytes())
+
+
+def mwrs_file(path, wavelengths: int, radii: int, seed: int = 0):
+    """Write an mwrs file with wavelengths x radii intensities"""
+    rng = np.random.default_rng(seed)
+    header = struct.pack('>BcHHHhfiHHHH', 1, b'A', 1, 50000, 50000, 200, 1.5e10, 3600, radii, 5800, 10,
+                         wavelengths)
+    lambdas = np.arange(2500, 2500 + 2 * wavelengths, 2, dtype='>u2')
+    intensities = rng.integers(0, 40000, size=(wavelengths, radii), dtype=np.int32).astype('>i4')
+    with open(path, 'wb') as f:
+        f.write(header + lambdas.tobytes() + intensities.tobytes())
+
+
+def mw_file(path, wavelengths: int, radii: int, seed: int = 0):
+    """Write an MW file with wavelengths x radii intensities"""
+    rng = np.random.default_rng(seed)
+    header = struct.pack('>I6sHBcH64sHHIIHHHH', 1234, (1711494000).to_bytes(6, 'big'), 11060, 1, b'A', 1,
+                         b'benchmark', 50000, 200, 15000, 3600, radii, 580, 720, wavelengths)
+    lambdas = np.arange(2500, 2500 + 2 * wavelengths, 2, dtype='>u2')
+    intensities = rng.integers(0, 40000, size=(wavelengths, radii), dtype=np.uint32).astype('>u4')
+    with open(path, 'wb') as f:
+        f.write(header + lambdas.tobytes() + intensities.tobytes())
+
+
+def tmst_file(path, records: int):
+    """Write a tmst file with one record per second"""
+    data = np.zeros(records, dtype=[('time', '>u4'), ('raw_speed', '>f4'), ('set_speed', '>u4'),
+                                    ('omega2t', '>f4'), ('temperature', '>f4'), ('step', '>u2'), ('scan', '>u2')])
+    data['time'] = np.arange(records)
+    data['raw_speed'] = np.minimum(data['time'] * 291.0, 50000.0)
+    data['set_speed'] = 50000
+    data['omega2t'] = np.cumsum((data['raw_speed'].astype(np.float64) * np.pi / 30) ** 2)
+    data['temperature'] = 20.0
+    data['step'] = 1
+    data['scan'] = data['time'] // 60
+    with open(path, 'wb') as f:
+        f.write(b'USTS' + bytes([1, 0]) + data.tobytes())
+
+
+def auc_dict(scans: int, radii: int, seed: int = 0) -> dict:
+    """Input of write_auc in the dict of lists form produced by cluster_packs"""
+    rng = np.random.default_rng(seed)
+    return {'cell': 1, 'description': 'benchmark', 'radii': (5.8 + 0.001 * np.arange(radii + 1)).tolist(),
+            'scanData': [{'temperature': 20.0, 'speed': 50000, 'seconds': 60 * (i + 1), 'omega2t': 1.6e9 * (i + 1),
+                          'wavelength': 675, 'radius_step': 0.001,
+                          'reading_values': rng.uniform(-1.0, 4.0, radii).tolist()} for i in range(scans)]}
+
+
+def intensity_lists(wavelengths: int, radii: int, seed: int = 0) -> list[list[float]]:
+    """Intensity matrix as nested lists as the converters pass it to write_mwrs and write_mw"""
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0.0, 4.0, size=(wavelengths, radii)).tolist()
@@ -1,13 +1,12 @@
 import pathlib
-import re
 import numpy as np
 import pandas as pd
 from collections import defaultdict
 from scipy.interpolate import interp1d
-from read_auc import read_auc
+from auc_run import load_auc_run
+from read_auc import iter_auc_scans, read_auc_header
 
 DIR = pathlib.Path(r"PATH")
-FILEPATTERN = re.compile(r"(?P<runID>[A-Za-z0-9-_]*)\.(?P<optic>[A-Z]*)\.(?P<cell>[0-9])\.(?P<channel>[A-Z])\.(?P<wavelength>[0-9]+)\.auc")
 
 
 def align_scan_to_reference(radial_positions, scan_values, reference_positions, reference_values, align_range=(6.0, 6.2)):
@@ -56,111 +55,70 @@ def align_scan_to_reference(radial_positions, scan_values, reference_positions,
 
 
 
+def max_aligned_values(file_path: str) -> dict | None:
+    """Maximum of the aligned scans of an auc file at every radial position, None if the file can't be used
+
+    Used as loader of load_auc_run, so it runs in a worker process per file.
+    """
+    filename = pathlib.Path(file_path).name
+    try:
+        # Check the scan metadata first, this doesn't need to decode the readings
+        header = read_auc_header(file_path)
+        scan_headers = header['scanData']
+        if not scan_headers:
+            print(f"  No scan data found in {filename}")
+            return None
+        if scan_headers[-1]['seconds'] > 35637:
+            print(f"  {filename}")
+            print(f"{scan_headers[-1]['seconds']} {scan_headers[-1]['omega2t']}")
+        # Get the number of radial positions from the last scan
+        num_positions = scan_headers[-1]['value_count']
+
+        # Construct the radius vector from the file header
+        radial_positions = header['delta_radius'] * np.arange(num_positions) + header['min_radius']
+
+        # some scans are slightly shifted interpolate the scan between 6.0 and 6.2 and shift the whole scan by the offset to the
+        # average value in that region
+        # Find maximum value at each radial position across all scans, streaming one scan at a time
+        max_values = np.full(num_positions, 0.001)
+        reference_values = None
+        for i, scan in enumerate(iter_auc_scans(file_path)):
+            reading_values = scan['reading_values']
+            if i == 0:
+                reference_values = reading_values
+            if len(reading_values) == num_positions:
+                if i == 0:
+                    aligned_values = reading_values
+                else:
+                    aligned_values = align_scan_to_reference(radial_positions, reading_values,
+                                                             radial_positions, reference_values,
+                                                             align_range=(6.0, 6.2))
+                max_values = np.maximum(max_values, aligned_values)
+            else:
+                print(f"  Warning: Scan {i} has {len(reading_values)} values, expected {num_positions}")
+
+        print(f"  {filename} successfully processed with {len(scan_headers)} scans")
+        return {'radial_positions': radial_positions, 'max_values': max_values}
+
+    except Exception as e:
+        print(f"  Error processing {filename}: {e}")
+        return None
+
+
 def process_auc_files():
     """Process all .auc files in the directory according to the specified workflow."""
     
-    # Step 1: Find all .auc files and extract metadata
-    auc_files = list(DIR.glob("*.auc"))
+    # Step 1: Find all .auc files and reduce every file to the maximum of its aligned scans in parallel
+    index = load_auc_run(DIR, loader=max_aligned_values)
     
     # Dictionary to store processed data grouped by runID, cell, channel
     grouped_data = {}
-    
-    print(f"Found {len(auc_files)} .auc files")
-    counter = 0
-    for file_path in auc_files:
-        filename = file_path.name
-        
-        # Extract metadata from filename
-        match = FILEPATTERN.match(filename)
-        if not match:
-            print(f"Skipping file {filename} - doesn't match pattern")
-            continue
-        
-        runID = match.group('runID')
-        optic = match.group('optic')
-        cell = match.group('cell')
-        channel = match.group('channel')
-        wavelength = int(match.group('wavelength'))
-        
-        #print(f"Processing: {filename}")
-        #print(f"  runID: {runID}, optic: {optic}, cell: {cell}, channel: {channel}, wavelength: {wavelength}")
-        
-        try:
-            # Read the .auc file
-            data = read_auc(str(file_path))
-            
-            # Calculate maximum for every radial position
-            scan_data = data['scanData']
-            if not scan_data:
-                print(f"  No scan data found in {filename}")
-                continue
-            if scan_data[-1]['seconds'] > 35637:
-                print(f"  runID: {runID}, optic: {optic}, cell: {cell}, channel: {channel}, wavelength: {wavelength}")
-                print(f"{scan_data[-1]['seconds']} {scan_data[-1]['omega2t']}")
-                counter += 1
-            #continue
-            # Get the number of radial positions from the first scan
-            num_positions = data['valueCount']
-            
-            # Initialize arrays for radial positions and maximum values
-            max_values = np.full(num_positions, 0.001)
-            
-            # Calculate radial positions
-            # Based on the read_auc.py code, we need to reconstruct the radius vector
-            # This seems to be missing from the original read_auc function
-            min_radius = 0  # This would need to be extracted from the file
-            delta_radius = 0  # This would need to be extracted from the file
-            
-            # Since the original read_auc doesn't return radius info, we'll use index positions
-            # In a real implementation, you'd need to modify read_auc to return radius information
-            radial_positions = data['radius']
-            
-            # some scans are slightly shifted interpolate the scan between 6.0 and 6.2 and shift the whole scan by the offset to the
-            # average value in that region
-            aligned_scans = []
-            if scan_data:
-                reference_values = np.array(scan_data[0]['reading_values'])
+    for group_key, wavelengths in index.groups().items():
+        wavelength_data = [{'wavelength': wavelength, **data} for wavelength, data in wavelengths.items()
+                           if data is not None]
+        if wavelength_data:
+            grouped_data[group_key] = wavelength_data
 
-            
-                # Find maximum value at each radial position across all scans
-                for i, scan in enumerate(scan_data):
-                    reading_values = np.array(scan['reading_values'])
-                    if len(reading_values) == num_positions:
-                        if i == 0:
-                            aligned_values = reading_values
-                        else:
-                            aligned_values = align_scan_to_reference(radial_positions, reading_values,
-                                                                     radial_positions, reference_values,
-                                                                     align_range=(6.0, 6.2))
-                        aligned_scans.append(aligned_values)
-                    else:
-                        print(f"  Warning: Scan {i} has {len(reading_values)} values, expected {num_positions}")
-                        
-            if aligned_scans:
-                max_values = np.full(num_positions, 0.001)
-                for aligned_scan in aligned_scans:
-                    max_values = np.maximum(max_values, aligned_scan)
-            else:
-                max_values = np.full(num_positions, 0.001)
-            
-            # Create key for grouping
-            group_key = (runID, cell, channel)
-            if group_key not in grouped_data:
-                grouped_data[group_key] = []
-            # Store the data for this wavelength
-            grouped_data[group_key].append({
-                'wavelength': wavelength,
-                'radial_positions': radial_positions,
-                'max_values': max_values
-            })
-            
-            print(f"  Successfully processed with {len(scan_data)} scans")
-        
-        except Exception as e:
-            print(f"  Error processing {filename}: {e}")
-            continue
-    #print(counter)
-    #return
     # Step 2: Process grouped data
     print(f"\nProcessing {len(grouped_data)} groups")
     
@@ -183,57 +183,62 @@ def calculate_and_store_omega2t():
     return df
 
 
-# load dataframe
-data = pd.read_csv(r"C:\Users\Lukas\PycharmProjects\us3utils\SystemStatusDataOptima1Run2424.csv")
-rows = [row for index, row in data.iterrows()]
-calculated_omega2t = []
-calculated_accel_rate = []
-calculated_accel_end = []
-calc_calculated_accel_rate = []
-calc_calculated_accel_end = []
-calc_omega2t_diff = []
-calculated_omegasquaredt = []
-# iterate over all rows of the dataframe and perform the calculations
-for index, row in enumerate(rows):
-    if index == 0:
-        calculated_omega2t.append(0.0)
-        calc_omega2t_diff.append(0.0)
-        calculated_accel_rate.append(0.0)
-        calculated_accel_end.append(0.0)
-        calc_calculated_accel_rate.append(0.0)
-        calc_calculated_accel_end.append(0.0)
-        calculated_omegasquaredt.append(0.0)
-        continue
-    # calculate omega2t
-    omega2t = calc_omega2t(calculated_omega2t[index-1], rows[index-1]['RPM'], rows[index-1]['ExperimentTime'], row['RPM'],
-                           row['ExperimentTime'])
-    calculated_omega2t.append(omega2t)
-    calc_omega2t_diff.append(omega2t - row["OmegaSquaredT"])
-    calculated_omegasquaredt.append(calc_omega2t(0.0, 0.0, 0.0, TARGET_SPEED, row['ExperimentTime'], ACCELERATION_RATE))
-    #if row['ExperimentTime'] < 180:
-    #    calculated_accel_rate.append()
-    #    calc_calculated_accel_rate.append(0.0)
-    #    calculated_accel_end.append(0.0)
-    #    calc_calculated_accel_rate.append(0.0)
-    #    calc_calculated_accel_end.append(0.0)
-    #    continue
-    # calculate acceleration rate and end time
-    accel_rate, accel_end = calc_acceleration(row['RPM'], row['ExperimentTime'], row['OmegaSquaredT'])
-    if accel_end > row['ExperimentTime']:
-        accel_rate = (row['RPM'])/(row['ExperimentTime'])
-    calculated_accel_rate.append(accel_rate)
-    calculated_accel_end.append(accel_end)
-    accel_rate, accel_end = calc_acceleration(row['RPM'], row['ExperimentTime'], omega2t)
-    calc_calculated_accel_rate.append(accel_rate)
-    calc_calculated_accel_end.append(accel_end)
-
-pure_calculations = calculate_and_store_omega2t()
-
-# create a new dataframe with the columns ExperimentTime, RPM, OmegaSquaredT, CalcOmegaSquaredT, AccelRate, AccelEnd, CalcAccelRate, CalcAccelEnd
-df = pd.DataFrame({'ExperimentTime': data['ExperimentTime'], 'RPM': data['RPM'], 'OmegaSquaredT': data['OmegaSquaredT'],
-                   'CalcOmegaSquaredT': calculated_omega2t, "OmegaSquaredTDiff": calc_omega2t_diff,
-                   'AccelRate': calculated_accel_rate, 'AccelEnd': calculated_accel_end,
-                   'CalcAccelRate': calc_calculated_accel_rate, 'CalcAccelEnd': calc_calculated_accel_end,
-                   'OmegaSquaredTPureSpeed': calculated_omegasquaredt})
-df.to_csv(r"C:\Users\Lukas\PycharmProjects\us3utils\SystemStatusDataOptima1Run2424_calc.csv")
-print("done")
+def main():
+    # load dataframe
+    data = pd.read_csv(r"C:\Users\Lukas\PycharmProjects\us3utils\SystemStatusDataOptima1Run2424.csv")
+    rows = [row for index, row in data.iterrows()]
+    calculated_omega2t = []
+    calculated_accel_rate = []
+    calculated_accel_end = []
+    calc_calculated_accel_rate = []
+    calc_calculated_accel_end = []
+    calc_omega2t_diff = []
+    calculated_omegasquaredt = []
+    # iterate over all rows of the dataframe and perform the calculations
+    for index, row in enumerate(rows):
+        if index == 0:
+            calculated_omega2t.append(0.0)
+            calc_omega2t_diff.append(0.0)
+            calculated_accel_rate.append(0.0)
+            calculated_accel_end.append(0.0)
+            calc_calculated_accel_rate.append(0.0)
+            calc_calculated_accel_end.append(0.0)
+            calculated_omegasquaredt.append(0.0)
+            continue
+        # calculate omega2t
+        omega2t = calc_omega2t(calculated_omega2t[index-1], rows[index-1]['RPM'], rows[index-1]['ExperimentTime'], row['RPM'],
+                               row['ExperimentTime'])
+        calculated_omega2t.append(omega2t)
+        calc_omega2t_diff.append(omega2t - row["OmegaSquaredT"])
+        calculated_omegasquaredt.append(calc_omega2t(0.0, 0.0, 0.0, TARGET_SPEED, row['ExperimentTime'], ACCELERATION_RATE))
+        #if row['ExperimentTime'] < 180:
+        #    calculated_accel_rate.append()
+        #    calc_calculated_accel_rate.append(0.0)
+        #    calculated_accel_end.append(0.0)
+        #    calc_calculated_accel_rate.append(0.0)
+        #    calc_calculated_accel_end.append(0.0)
+        #    continue
+        # calculate acceleration rate and end time
+        accel_rate, accel_end = calc_acceleration(row['RPM'], row['ExperimentTime'], row['OmegaSquaredT'])
+        if accel_end > row['ExperimentTime']:
+            accel_rate = (row['RPM'])/(row['ExperimentTime'])
+        calculated_accel_rate.append(accel_rate)
+        calculated_accel_end.append(accel_end)
+        accel_rate, accel_end = calc_acceleration(row['RPM'], row['ExperimentTime'], omega2t)
+        calc_calculated_accel_rate.append(accel_rate)
+        calc_calculated_accel_end.append(accel_end)
+
+    pure_calculations = calculate_and_store_omega2t()
+
+    # create a new dataframe with the columns ExperimentTime, RPM, OmegaSquaredT, CalcOmegaSquaredT, AccelRate, AccelEnd, CalcAccelRate, CalcAccelEnd
+    df = pd.DataFrame({'ExperimentTime': data['ExperimentTime'], 'RPM': data['RPM'], 'OmegaSquaredT': data['OmegaSquaredT'],
+                       'CalcOmegaSquaredT': calculated_omega2t, "OmegaSquaredTDiff": calc_omega2t_diff,
+                       'AccelRate': calculated_accel_rate, 'AccelEnd': calculated_accel_end,
+                       'CalcAccelRate': calc_calculated_accel_rate, 'CalcAccelEnd': calc_calculated_accel_end,
+                       'OmegaSquaredTPureSpeed': calculated_omegasquaredt})
+    df.to_csv(r"C:\Users\Lukas\PycharmProjects\us3utils\SystemStatusDataOptima1Run2424_calc.csv")
+    print("done")
+
+
+if __name__ == '__main__':
+    main()
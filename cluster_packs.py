@@ -3,9 +3,18 @@ import collections
 import sys
 from pathlib import Path
 import struct
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
+
+from ip_store import IpStore, open_ip_store
+from read_ip import read_ip
 from write_auc import write_auc
 from write_mwrs import write_mwrs
+from write_tmst import synthesize_time_state, write_tmst
+
+# scan meta data kept for synthesizing the time state
+TIME_STATE_FIELDS = ('cell', 'scan', 'seconds', 'speed', 'omega2t', 'temperature')
 
 
 def count_scans(directory):
@@ -40,50 +49,69 @@ def generate_scans_to_read(scan_pairs):
     return scans_to_read
 
 
-def read_scans(directory, scans_to_read, cells):
-    """Read the scans from the directory"""
-    raw_scans = {}
-    for scan in scans_to_read:
-        for cell in cells:
-            filename = Path(directory) / f'{scan:05}.IP{cell}'
-            data = {'cell': cell, 'scan': scan, 'channel': 'A'}
-            if filename.exists():
-                print(f'Reading {filename}')
-                with open(filename) as f:
-                    radii = []
-                    full_radii = []
-                    readings = []
-                    radius_old = 0
-                    for c, line in enumerate(f.readlines()):
-                        if c == 0:
-                            data['description'] = line.strip().split(', ')[1]
-                        elif c == 1:
-                            [idk, cell2, temperature, speed, seconds, omega2t, wavelength, idk4] = line.strip().split()
-                            data['temperature'] = float(temperature)
-                            data['speed'] = int(speed)
-                            data['seconds'] = int(seconds)
-                            data['omega2t'] = float(omega2t)
-                            data['wavelength'] = int(wavelength)
-                            if cell != int(cell2):
-                                raise Exception(f'Cell {cell} does not match cell {cell2} in file {filename}')
-                        else:
-                            line = line.strip().split()
-                            radius = float(line[0])
-                            reading = float(line[-1])
-                            readings.append(reading)
-                            full_radii.append(radius)
-                            if not radius_old:
-                                radius_old = radius
-                                data['radius_start'] = radius
-                            else:
-                                radii.append(abs(radius - radius_old))
-                                radius_old = radius
-                    data['readings'] = readings
-                    data['radius'] = full_radii
-                    avg_step = round(sum(radii) / len(radii), 6)
-                    data['radius_step'] = avg_step
-                raw_scans[f'{cell}_{scan}'] = data
-    return raw_scans
+def scan_data(cell, scan, header, radius, readings):
+    """Raw data dict of a scan from its parsed header record and columns"""
+    if cell != header.cell:
+        raise Exception(f'Cell {cell} does not match cell {header.cell} in scan {scan}')
+    valid = ~(np.isnan(radius) | np.isnan(readings))
+    radius, readings = radius[valid], readings[valid]
+    return {'cell': cell, 'scan': scan, 'channel': 'A',
+            'description': str(header.description),
+            'temperature': float(header.temperature),
+            'speed': int(header.speed),
+            'seconds': int(header.seconds),
+            'omega2t': float(header.omega2t),
+            'wavelength': int(header.wavelength),
+            'readings': readings,
+            'radius': radius,
+            'radius_start': float(radius[0]),
+            'radius_step': round(float(np.mean(np.abs(np.diff(radius)))), 6)}
+
+
+def read_scan(directory, cell, scan):
+    """Read one scan of a cell, None if its file doesn't exist"""
+    filename = Path(directory) / f'{scan:05}.IP{cell}'
+    if not filename.exists():
+        return None
+    print(f'Reading {filename}')
+    return scan_data(cell, scan, *read_ip(filename))
+
+
+def read_packs(directory, cells, packs, workers: int | None = None, store: IpStore | None = None):
+    """Read the scans pack by pack and yield every cell and pack with the raw data of only this pack
+
+    The files are parsed in a process pool, the next pack is read while the current one is exported, so at most two
+    packs are held in memory. With a store the scans are taken from its memory mapped matrices instead.
+    """
+    tasks = [(cell, pack) for cell in cells for pack in packs]
+    if store is not None:
+        for cell, pack in tasks:
+            scans = ((scan, store.read_scan(cell, scan)) for scan in pack)
+            yield cell, pack, {f'{cell}_{scan}': scan_data(cell, scan, *parsed)
+                               for scan, parsed in scans if parsed is not None}
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def submit(cell, pack):
+            return [executor.submit(read_scan, directory, cell, scan) for scan in pack]
+
+        futures = submit(*tasks[0]) if tasks else []
+        for k, (cell, pack) in enumerate(tasks):
+            current = futures
+            # read the next pack while the current one is exported
+            if k + 1 < len(tasks):
+                futures = submit(*tasks[k + 1])
+            scans = (future.result() for future in current)
+            yield cell, pack, {f'{cell}_{scan}': data for scan, data in zip(pack, scans) if data is not None}
+
+
+def generate_packs(packages):
+    """Expand the scan pairs of the packages into lists of scan numbers"""
+    packs = []
+    for pair in packages:
+        [lower, upper] = pair
+        packs.append([x for x in range(int(lower), int(upper) + 1)])
+    return packs
+
 
 def export_packages_mwrs(raw_data, output_dir, cells, packages):
     """Export the packages to mwrs files"""
@@ -109,53 +137,82 @@ def export_packages_mwrs(raw_data, output_dir, cells, packages):
                 with open(Path(output_dir) / f"{scan['description']}.{cell}.A.sample.{x:03}.mwrs", 'wb') as f:
                     f.write(data)
 
+def export_package_auc(raw_data, output_dir, cell, pack, run_id: str = None):
+    """Export one package of a cell to an auc file"""
+    if not pack:
+        print('cell {cell}: skip empty package', file=sys.stderr)
+        return
+    wave = max(pack)
+    scan = {}
+    for j in pack:
+        try:
+            scan = raw_data[f'{cell}_{j}']
+            break
+        except KeyError:
+            pass
+    if not scan:
+        print(f'cell {cell}: no scans in pack {pack[0]} to {pack[-1]}', file=sys.stderr)
+        return
+
+    c_run_id = run_id if run_id else scan['description']
+    data = {'cell': cell, 'description': scan['description'],
+            'radii': scan['radius'],
+            'scanData': []}
+    for x in pack:
+        if f'{cell}_{x}' not in raw_data:
+            print(f'Cell {cell} scan {x} not found in raw data', file=sys.stderr)
+            continue
+        scan = raw_data[f'{cell}_{x}']
+        data['scanData'].append({'temperature': scan['temperature'], 'speed': scan['speed'],
+                                 'seconds': scan['seconds'], 'omega2t': scan['omega2t'],
+                                 'wavelength': wave, 'radius_step': scan['radius_step'],
+                                 'reading_values': scan['readings'][:-1]})
+    filename = Path(output_dir) / f"{c_run_id}.IP.{cell}.A.{wave:04}.auc"
+    if not Path(output_dir).is_dir():
+        Path(output_dir).mkdir()
+    write_auc(str(filename), data)
+
+
 def export_packages_auc(raw_data, output_dir, cells, packages, run_id: str = None):
     """Export the packages to auc files"""
-    packs = []
-
-    for pair in packages:
-        [lower, upper] = pair
-        packs.append([x for x in range(int(lower), int(upper) + 1)])
+    packs = generate_packs(packages)
     for cell in cells:
         for i in packs:
-            if not i:
-                print('cell {cell}: skip empty package', file=sys.stderr)
-                continue
-            wave = max(i)
-            scan = {}
-            for j in i:
-                try:
-                    scan = raw_data[f'{cell}_{j}']
-                    break
-                except KeyError:
-                    pass
-            if not scan:
-                print(f'cell {cell}: no scans in pack {i[0]} to {i[-1]}', file=sys.stderr)
-                continue
-            
-            c_run_id = run_id if run_id else scan['description']
-            data = {'cell': cell, 'description': scan['description'],
-                    'radii': scan['radius'],
-                    'scanData': []}
-            for x in i:
-                if f'{cell}_{x}' not in raw_data:
-                    print(f'Cell {cell} scan {x} not found in raw data', file=sys.stderr)
-                    continue
-                scan = raw_data[f'{cell}_{x}']
-                data['scanData'].append({'temperature': scan['temperature'], 'speed': scan['speed'],
-                                         'seconds': scan['seconds'], 'omega2t': scan['omega2t'],
-                                         'wavelength': wave, 'radius_step': scan['radius_step'],
-                                         'reading_values': scan['readings'][:-1]})
-            filename = Path(output_dir) / f"{c_run_id}.IP.{cell}.A.{wave:04}.auc"
-            if not Path(output_dir).is_dir():
-                Path(output_dir).mkdir()
-            write_auc(str(filename), data)
+            export_package_auc(raw_data, output_dir, cell, i, run_id)
 
 
-def main(directory, output_dir, scan_pairs=[], scans_per_package=50):
+def export_time_state(raw_data, output_dir, cells, run_id: str):
+    """Export the time state of the run synthesized from the scans of the first cell with data"""
+    for cell in cells:
+        scans = sorted((scan for scan in raw_data.values() if scan['cell'] == cell), key=lambda scan: scan['scan'])
+        if scans:
+            break
+    else:
+        print('no scans to synthesize a time state from', file=sys.stderr)
+        return
+    records = synthesize_time_state([scan['seconds'] for scan in scans], [scan['speed'] for scan in scans],
+                                    [scan['omega2t'] for scan in scans], [scan['temperature'] for scan in scans],
+                                    [scan['scan'] for scan in scans])
+    write_tmst(str(Path(output_dir) / f"{run_id}.time_state.tmst"), records)
+
+
+def main(directory, output_dir, scan_pairs=[], scans_per_package=50, workers: int | None = None,
+         use_store: bool = True):
     # Your processing logic goes here
     run_id = Path(output_dir).stem
-    scan_counts = count_scans(directory)
+    store = None
+    if use_store:
+        # pack the raw files once into a binary store, reused as long as they don't change
+        try:
+            store = open_ip_store(directory, workers=workers)
+        except (OSError, ValueError) as e:
+            print(f'Could not use the ip store of {directory} ({e}), parsing the raw files instead', file=sys.stderr)
+    if store is not None:
+        scan_counts = store.scan_counts()
+        for cell, scan_count in scan_counts.items():
+            print(f'Cell {cell} has {scan_count} scans.')
+    else:
+        scan_counts = count_scans(directory)
     if not scan_pairs or len(scan_pairs) == 0:
         # generate scan pairs from scans per package
         scan_pairs = []
@@ -172,8 +229,14 @@ def main(directory, output_dir, scan_pairs=[], scans_per_package=50):
     for cell, scan_count in scan_counts.items():
         if scan_count < max_scan:
             print(f'Cell {cell} has only {scan_count} scans, want {max_scan}.', file=sys.stderr)
-    raw_data = read_scans(directory, scans_to_read, scan_counts.keys())
-    export_packages_auc(raw_data, str(output_dir), scan_counts.keys(), scan_pairs, run_id)
+    # read, export and release one pack at a time, only the meta data is kept for the time state
+    time_state = {}
+    for cell, pack, raw_data in read_packs(directory, list(scan_counts.keys()), generate_packs(scan_pairs), workers,
+                                         store):
+        export_package_auc(raw_data, str(output_dir), cell, pack, run_id)
+        for key, scan in raw_data.items():
+            time_state[key] = {name: scan[name] for name in TIME_STATE_FIELDS}
+    export_time_state(time_state, str(output_dir), scan_counts.keys(), run_id)
 
 
 
@@ -184,6 +247,10 @@ if __name__ == '__main__':
     parser.add_argument('directory', type=str, help='Input directory with raw data')
     parser.add_argument('-scan_pairs', type=str, nargs='+', help='Pairs of numbers', required=False)
     parser.add_argument('-spp', type=int, help='Scans per package', required=False)
+    parser.add_argument('-output', type=str, help='Output directory, defaults to the input directory',
+                        required=False)
+    parser.add_argument('-workers', type=int, help='Number of worker processes', required=False)
+    parser.add_argument('-no_store', action='store_true', help='Parse the raw files instead of using the .ip_store')
 
     args = parser.parse_args()
     if args.scan_pairs is None and args.spp is None:
@@ -194,4 +261,4 @@ if __name__ == '__main__':
     else:
         scan_pairs = []
 
-    main(args.directory, scan_pairs, args.spp)
\ No newline at end of file
+    main(args.directory, args.output or args.directory, scan_pairs, args.spp or 50, args.workers, not args.no_store)
\ No newline at end of file
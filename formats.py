@@ -0,0 +1,157 @@
+"""Format detection and lazy readers for the UltraScan file formats
+
+open_dataset only sniffs the first bytes and the extension of a file, the readers and with them NumPy and pandas are
+imported when a header or the data is accessed.
+"""
+import argparse
+import pathlib
+import re
+
+AUC_MAGIC = b'UCDA'
+# .MW1 to .MW8 and so on, one extension per cell
+MW_SUFFIX = re.compile(r'\.MW\d+$', re.IGNORECASE)
+SNIFF_SIZE = 512
+
+
+class Dataset:
+    """Lazy reader of one file, nothing is decoded before header or load is accessed"""
+    format = None
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self._header = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({str(self.path)!r})"
+
+    @property
+    def header(self):
+        """Meta data of the file, read once on first access"""
+        if self._header is None:
+            self._header = self._read_header()
+        return self._header
+
+    def _read_header(self):
+        raise NotImplementedError
+
+    def load(self):
+        """Decode the data of the file"""
+        raise NotImplementedError
+
+
+class AucDataset(Dataset):
+    format = 'auc'
+
+    def _read_header(self) -> dict:
+        from read_auc import read_auc_header
+        return read_auc_header(str(self.path))
+
+    def open(self):
+        """Memory mapped AucFile for random access to single scans"""
+        from read_auc import AucFile
+        return AucFile(str(self.path))
+
+    def load(self):
+        """All scans as AucData, served from the auc cache if it is enabled"""
+        from read_auc import load_auc
+        return load_auc(str(self.path))
+
+
+class MwrsDataset(Dataset):
+    format = 'mwrs'
+    FIELDS = ('cell', 'channel', 'scan', 'set_speed', 'speed', 'temperature', 'omega2t', 'seconds', 'radius_count',
+              'radius_start', 'radius_step', 'lambdas')
+
+    def _read_header(self) -> dict:
+        return dict(zip(self.FIELDS, self.load()))
+
+    def load(self) -> tuple:
+        """The tuple of read_mwrs with the intensities memory mapped"""
+        from read_mwrs import read_mwrs
+        return read_mwrs(str(self.path), mmap=True)
+
+
+class MwDataset(Dataset):
+    format = 'mw'
+
+    def _read_header(self) -> dict:
+        from read_mw import read_mw
+        return read_mw(str(self.path), header_only=True)
+
+    def load(self) -> dict:
+        """The dict of read_mw with the intensities memory mapped"""
+        from read_mw import read_mw
+        return read_mw(str(self.path))
+
+
+class TmstDataset(Dataset):
+    format = 'tmst'
+
+    def _read_header(self) -> dict:
+        with open(self.path, 'rb') as f:
+            magic_number = f.read(4).decode('utf-8')
+            major_version, minor_version = f.read(2)
+        return {'MagicNumber': magic_number, 'MajorVersion': major_version, 'MinorVersion': minor_version}
+
+    def load(self) -> dict:
+        """The dict of read_tmst with the records memory mapped"""
+        from read_tmst import read_tmst
+        return read_tmst(str(self.path), mmap=True)
+
+
+class ModelXmlDataset(Dataset):
+    format = 'model_xml'
+
+    def _read_header(self) -> list[dict]:
+        """Attributes of every model element, parsed without pandas"""
+        import xml.etree.ElementTree as ET
+        return [dict(model.attrib) for model in ET.parse(self.path).getroot().iter('model')]
+
+    def load(self):
+        """Analytes of all models as pandas DataFrame"""
+        import pandas as pd
+        return pd.read_xml(self.path, xpath='//ModelData/model/analyte')
+
+
+FORMATS = {dataset.format: dataset for dataset in (AucDataset, MwrsDataset, MwDataset, TmstDataset, ModelXmlDataset)}
+
+
+def sniff(path) -> str | None:
+    """Detect the format of a file by its magic bytes or extension, None if it is unknown"""
+    path = pathlib.Path(path)
+    with open(path, 'rb') as f:
+        head = f.read(SNIFF_SIZE)
+    if head.startswith(AUC_MAGIC):
+        return 'auc'
+    suffix = path.suffix.lower()
+    if suffix == '.mwrs':
+        return 'mwrs'
+    if MW_SUFFIX.search(path.name):
+        return 'mw'
+    if suffix == '.tmst':
+        return 'tmst'
+    if b'<ModelData' in head or (suffix == '.xml' and head.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'<?xml')):
+        return 'model_xml'
+    return None
+
+
+def open_dataset(path) -> Dataset:
+    """Return the lazy reader matching the format of a file"""
+    format = sniff(path)
+    if format is None:
+        raise ValueError(f"Unknown file format of {path}")
+    return FORMATS[format](path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Detect the format of UltraScan files and print their header.')
+    parser.add_argument('files', type=str, nargs='+', help='Files to inspect')
+    args = parser.parse_args()
+    for filename in args.files:
+        try:
+            dataset = open_dataset(filename)
+        except ValueError as e:
+            print(e)
+            continue
+        print(f'{filename}: {dataset.format}')
+        print(f'  {dataset.header}')
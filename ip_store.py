@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import pathlib
+import re
+import shutil
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from read_ip import HEADER_DTYPE, read_ip
+
+STORE_VERSION = 1
+STORE_DIRNAME = '.ip_store'
+# 00001.IP1 and so on, scan number and cell
+IP_PATTERN = re.compile(r'^(?P<scan>[0-9]+)\.IP(?P<cell>[0-9]+)$')
+# header table of a cell, one row per scan
+SCAN_DTYPE = np.dtype([('scan', '<i4'), ('points', '<i4')]
+                      + [(name, HEADER_DTYPE[name]) for name in HEADER_DTYPE.names])
+
+
+def find_ip_files(directory) -> dict[int, dict[int, pathlib.Path]]:
+    """Raw .IPn files of a directory by cell and scan number"""
+    files = {}
+    for path in pathlib.Path(directory).iterdir():
+        match = IP_PATTERN.match(path.name)
+        if match:
+            files.setdefault(int(match.group('cell')), {})[int(match.group('scan'))] = path
+    return files
+
+
+def sources_fingerprint(files: dict[int, dict[int, pathlib.Path]]) -> str:
+    """Fingerprint of the names, sizes and mtimes of the raw files, changes whenever a file is added or modified"""
+    digest = hashlib.blake2b(digest_size=16)
+    for cell in sorted(files):
+        for scan in sorted(files[cell]):
+            stat = files[cell][scan].stat()
+            digest.update(f"{files[cell][scan].name}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+class IpStore:
+    """Memory mapped binary store of the raw scans of an IP directory
+
+    The store is a directory with a meta.json and per cell a header table (SCAN_DTYPE) and NaN padded
+    (scan, point) matrices of the radius and reading columns as .npy files. Rows are sorted by scan number, which is
+    the index used to look up a scan. Files which couldn't be parsed keep their row with points set to -1 and are
+    treated as missing scans.
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        with open(self.path / 'meta.json') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported ip store version {self.meta.get('version')}")
+        self.cells = self.meta['cells']
+        self.headers = {cell: np.load(self.path / f'headers{cell}.npy').view(np.recarray) for cell in self.cells}
+        self.radius = {cell: np.load(self.path / f'radius{cell}.npy', mmap_mode='r') for cell in self.cells}
+        self.readings = {cell: np.load(self.path / f'readings{cell}.npy', mmap_mode='r') for cell in self.cells}
+
+    def scans(self, cell: int) -> np.ndarray:
+        """Sorted scan numbers of a cell"""
+        return self.headers[cell]['scan']
+
+    def scan_counts(self) -> dict[int, int]:
+        """Highest scan number of every cell, like cluster_packs.count_scans"""
+        return {cell: int(self.scans(cell)[-1]) for cell in self.cells if len(self.scans(cell))}
+
+    def index(self, cell: int, scan: int) -> int:
+        """Row of a scan in the matrices of its cell, -1 if it isn't stored or couldn't be parsed"""
+        if cell not in self.headers:
+            return -1
+        scans = self.scans(cell)
+        row = int(np.searchsorted(scans, scan))
+        if row < len(scans) and scans[row] == scan and self.headers[cell]['points'][row] >= 0:
+            return row
+        return -1
+
+    def read_scan(self, cell: int, scan: int) -> tuple[np.record, np.ndarray, np.ndarray] | None:
+        """Header record, radius and readings of a scan like read_ip, None if it isn't stored"""
+        row = self.index(cell, scan)
+        if row < 0:
+            return None
+        header = self.headers[cell][row]
+        points = header['points']
+        return header, np.asarray(self.radius[cell][row, :points]), np.asarray(self.readings[cell][row, :points])
+
+
+def count_rows(filename) -> int:
+    """Upper bound of the rows read_ip returns for a file, without parsing it"""
+    with open(filename, 'rb') as f:
+        lines = f.read().split(b'\n', 2)
+    body = lines[2] if len(lines) > 2 else b''
+    # parse_ip_columns returns one row per newline separated line, the line by line fallback one per splitlines line
+    return max(body.count(b'\n') + (not body.endswith(b'\n')), len(body.splitlines())) if body else 0
+
+
+def read_ip_or_none(filename) -> tuple[np.record, np.ndarray, np.ndarray] | None:
+    """read_ip for building a store, None if the file can't be parsed"""
+    try:
+        return read_ip(filename)
+    except ValueError as e:
+        print(f'Skipping {filename}, it can\'t be parsed: {e}')
+        return None
+
+
+def build_ip_store(directory, path=None, workers: int | None = None) -> IpStore:
+    """Parse all raw files of an IP directory in parallel and pack them into a store, one cell at a time
+
+    path defaults to the .ip_store directory inside the raw directory. An existing store is replaced. Files which
+    can't be parsed, like empty or half written ones, are left out and listed in the meta data. The width of the
+    matrices is counted in a first cheap pass, the parsed scans are then written into them as they arrive, so only the
+    scans in flight are held in memory.
+    """
+    path = pathlib.Path(path or pathlib.Path(directory) / STORE_DIRNAME)
+    files = find_ip_files(directory)
+    fingerprint = sources_fingerprint(files)
+    # build into a temporary directory first, so a partial store is never used
+    tmp = path.with_name(f'.tmp-{path.name}-{uuid.uuid4().hex}')
+    tmp.mkdir(parents=True)
+    unreadable = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for cell in sorted(files):
+                scans = sorted(files[cell])
+                paths = [files[cell][scan] for scan in scans]
+                print(f'Packing {len(scans)} scans of cell {cell}')
+                width = max(executor.map(count_rows, paths, chunksize=64), default=0)
+                headers = np.zeros(len(scans), dtype=SCAN_DTYPE)
+                headers['scan'] = scans
+                radius = np.lib.format.open_memmap(tmp / f'radius{cell}.npy', mode='w+', dtype=np.float64,
+                                                   shape=(len(scans), width))
+                readings = np.lib.format.open_memmap(tmp / f'readings{cell}.npy', mode='w+', dtype=np.float64,
+                                                     shape=(len(scans), width))
+                radius[...] = np.nan
+                readings[...] = np.nan
+                for row, parsed in enumerate(executor.map(read_ip_or_none, paths, chunksize=64)):
+                    if parsed is None:
+                        headers['points'][row] = -1
+                        unreadable.setdefault(cell, []).append(paths[row].name)
+                        continue
+                    header, r, v = parsed
+                    headers['points'][row] = len(r)
+                    for name in HEADER_DTYPE.names:
+                        headers[name][row] = header[name]
+                    radius[row, :len(r)] = r
+                    readings[row, :len(v)] = v
+                radius.flush()
+                readings.flush()
+                del radius, readings
+                np.save(tmp / f'headers{cell}.npy', headers)
+        with open(tmp / 'meta.json', 'w') as f:
+            json.dump({'version': STORE_VERSION, 'cells': sorted(files), 'sources': fingerprint,
+                       'unreadable': unreadable}, f)
+        if path.exists():
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return IpStore(path)
+
+
+def open_ip_store(directory, path=None, workers: int | None = None) -> IpStore:
+    """Open the store of an IP directory, (re)building it if it is missing or the raw files changed"""
+    path = pathlib.Path(path or pathlib.Path(directory) / STORE_DIRNAME)
+    try:
+        store = IpStore(path)
+    except (FileNotFoundError, ValueError):
+        return build_ip_store(directory, path, workers)
+    if store.meta.get('sources') != sources_fingerprint(find_ip_files(directory)):
+        print(f'Raw files in {directory} changed, rebuilding {path}')
+        return build_ip_store(directory, path, workers)
+    return store
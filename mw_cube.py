@@ -0,0 +1,233 @@
+import json
+import os
+import pathlib
+import shutil
+import uuid
+
+import numpy as np
+
+from read_auc import AucFile
+from read_mw import read_mw
+from read_mwrs import read_mwrs
+
+CUBE_VERSION = 1
+# scans and wavelengths per chunk, every chunk holds the full radius
+DEFAULT_CHUNKS = (16, 16)
+# per scan meta data, averaged over the wavelengths when built from auc files
+SCAN_DTYPE = np.dtype([
+    ('scan', '<i4'),
+    ('temperature', '<f8'),
+    ('rpm', '<f8'),
+    ('seconds', '<f8'),
+    ('omega2t', '<f8'),
+])
+
+
+class MwCube:
+    """Memory mapped (scan x wavelength x radius) intensity cube of a multi-wavelength run
+
+    A cube is a directory with a meta.json, the scan table, lambdas and radius as .npy files and data.npy, a float32
+    array of the shape (scan_chunks, wavelength_chunks, chunk_scans, chunk_wavelengths, radius). Every chunk is a
+    contiguous block of the file, so slicing one wavelength across all scans or one scan across all wavelengths only
+    touches the chunks holding it. The radius is in cm for every builder.
+    """
+
+    def __init__(self, directory, mode: str = 'r'):
+        self.directory = pathlib.Path(directory)
+        with open(self.directory / 'meta.json') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != CUBE_VERSION:
+            raise ValueError(f"Unsupported cube version {self.meta.get('version')}")
+        self.scans = np.load(self.directory / 'scans.npy')
+        self.lambdas = np.load(self.directory / 'lambdas.npy')
+        self.radius = np.load(self.directory / 'radius.npy')
+        self.chunks = tuple(self.meta['chunks'])
+        self.data = np.load(self.directory / 'data.npy', mmap_mode=mode)
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return len(self.scans), len(self.lambdas), len(self.radius)
+
+    def __len__(self):
+        return len(self.scans)
+
+    def __repr__(self):
+        return f"MwCube({str(self.directory)!r}, shape={self.shape}, chunks={self.chunks})"
+
+    def _index(self, key) -> tuple[tuple, object, bool, bool]:
+        """Translate cube[scans, wavelengths, radii] into an index of the (scan, wavelength) rows of the chunked data
+        array and the radius key, which is applied to the gathered rows separately"""
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 3:
+            raise IndexError("too many indices for a cube")
+        key = key + (slice(None),) * (3 - len(key))
+        scans = np.arange(len(self.scans))[key[0]]
+        wavelengths = np.arange(len(self.lambdas))[key[1]]
+        scan_chunk, wavelength_chunk = self.chunks
+        s = np.atleast_1d(scans)[:, None]
+        w = np.atleast_1d(wavelengths)[None, :]
+        index = (s // scan_chunk, w // wavelength_chunk, s % scan_chunk, w % wavelength_chunk)
+        return index, key[2], np.ndim(scans) == 0, np.ndim(wavelengths) == 0
+
+    def __getitem__(self, key) -> np.ndarray:
+        """Intensities of cube[scans, wavelengths, radii] by index, integer indices drop their axis"""
+        index, radii, single_scan, single_wavelength = self._index(key)
+        values = self.data[index][:, :, radii]
+        if single_wavelength:
+            values = values[:, 0]
+        if single_scan:
+            values = values[0]
+        return values
+
+    def __setitem__(self, key, value):
+        """Store intensities like cube[scan, :] = (wavelength, radius) or cube[:, wavelength] = (scan, radius)"""
+        index, radii, single_scan, single_wavelength = self._index(key)
+        value = np.asarray(value, dtype=np.float32)
+        if single_scan:
+            value = value[None]
+        if single_wavelength:
+            value = np.expand_dims(value, 1)
+        if isinstance(radii, slice) and radii == slice(None):
+            self.data[index] = value
+            return
+        # only part of the radius is written, update the gathered rows and store them back
+        rows = self.data[index]
+        rows[:, :, radii] = value
+        self.data[index] = rows
+
+    def wavelength(self, wavelength: float) -> np.ndarray:
+        """(scan, radius) intensities of a wavelength given in nm"""
+        index = np.flatnonzero(np.isclose(self.lambdas, wavelength))
+        if not len(index):
+            raise KeyError(f"Wavelength {wavelength} not in cube")
+        return self[:, int(index[0])]
+
+    def scan(self, scan: int) -> np.ndarray:
+        """(wavelength, radius) intensities of a scan by its scan number"""
+        index = np.flatnonzero(self.scans['scan'] == scan)
+        if not len(index):
+            raise KeyError(f"Scan {scan} not in cube")
+        return self[int(index[0])]
+
+    def flush(self):
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
+
+
+def create_cube(directory, scans: np.ndarray, lambdas, radius, cell: int, channel: str, description: str = '',
+                chunks: tuple[int, int] = DEFAULT_CHUNKS) -> MwCube:
+    """Create an empty cube and return it opened for writing
+
+    scans is an array of SCAN_DTYPE, the intensities are filled in scan or wavelength wise with cube[scan, :] = ...
+    or cube[:, wavelength] = ... An existing cube in directory is replaced.
+    """
+    directory = pathlib.Path(directory)
+    scans = np.asarray(scans, dtype=SCAN_DTYPE)
+    lambdas = np.asarray(lambdas, dtype=np.float64)
+    radius = np.asarray(radius, dtype=np.float64)
+    scan_chunk = max(1, min(chunks[0], len(scans)))
+    wavelength_chunk = max(1, min(chunks[1], len(lambdas)))
+    shape = (-(-len(scans) // scan_chunk), -(-len(lambdas) // wavelength_chunk), scan_chunk, wavelength_chunk,
+             len(radius))
+    # build the cube in a temporary directory, so readers never see a partial cube
+    tmp = directory.with_name(f'.tmp-{directory.name}-{uuid.uuid4().hex}')
+    tmp.mkdir(parents=True)
+    np.save(tmp / 'scans.npy', scans)
+    np.save(tmp / 'lambdas.npy', lambdas)
+    np.save(tmp / 'radius.npy', radius)
+    data = np.lib.format.open_memmap(tmp / 'data.npy', mode='w+', dtype=np.float32, shape=shape)
+    data[...] = np.nan
+    data.flush()
+    del data
+    with open(tmp / 'meta.json', 'w') as f:
+        json.dump({'version': CUBE_VERSION, 'cell': cell, 'channel': channel, 'description': description,
+                   'chunks': [scan_chunk, wavelength_chunk]}, f)
+    if directory.exists():
+        shutil.rmtree(directory)
+    os.replace(tmp, directory)
+    return MwCube(directory, mode='r+')
+
+
+def cube_from_auc(directory, files, chunks: tuple[int, int] = DEFAULT_CHUNKS) -> MwCube:
+    """Build a cube from the auc files of one cell and channel, one file per wavelength
+
+    The scans are matched by their position like in convert_auc_to_mw, the scan meta data is averaged over the
+    wavelengths. Readings on a different radius grid than the first file are interpolated onto it. Only one
+    wavelength is held in memory at a time.
+    """
+    headers = []
+    for filename in files:
+        with AucFile(filename) as auc:
+            headers.append((auc.header, auc.scans, auc.radius))
+    order = sorted(range(len(files)), key=lambda i: headers[i][1][0]['wavelength'] if headers[i][1] else 0)
+    files = [files[i] for i in order]
+    headers = [headers[i] for i in order]
+    header, _, radius = headers[0]
+    scan_count = min(len(scans) for _, scans, _ in headers)
+    lambdas = [scans[0]['wavelength'] for _, scans, _ in headers]
+
+    scans = np.zeros(scan_count, dtype=SCAN_DTYPE)
+    scans['scan'] = np.arange(1, scan_count + 1)
+    for name in ('temperature', 'rpm', 'seconds', 'omega2t'):
+        scans[name] = np.mean([[scan[name] for scan in s[:scan_count]] for _, s, _ in headers], axis=0)
+
+    cube = create_cube(directory, scans, lambdas, radius, header['cell'], header['channel'], header['description'],
+                       chunks)
+    for w, filename in enumerate(files):
+        with AucFile(filename) as auc:
+            data = auc.load()
+        readings = np.asarray(data.readings[:scan_count], dtype=np.float32)
+        if readings.shape[1] != len(radius) or not np.allclose(data.radius, radius):
+            readings = np.array([np.interp(radius, data.radius, row) for row in readings], dtype=np.float32)
+        cube[:, w] = readings
+    cube.flush()
+    return cube
+
+
+def cube_from_mwrs(directory, files, chunks: tuple[int, int] = DEFAULT_CHUNKS) -> MwCube:
+    """Build a cube from the mwrs files of one cell and channel, one file per scan
+
+    The stored intensities are divided by 10000. write_mwrs offsets every wavelength by its minimum if that is
+    negative and doesn't store the offset, so such wavelengths come back shifted and the offset is lost.
+    """
+    headers = []
+    for filename in files:
+        (cell, channel, scan, set_speed, speed, temperature, omega2t, seconds, radius_count, radius_start,
+         radius_step, lambdas, _) = read_mwrs(filename, mmap=True)
+        headers.append((scan, cell, channel, temperature, speed, seconds, omega2t, radius_count, radius_start,
+                        radius_step, lambdas))
+    order = sorted(range(len(files)), key=lambda i: headers[i][0])
+    _, cell, channel, _, _, _, _, radius_count, radius_start, radius_step, lambdas = headers[order[0]]
+    radius = radius_start + np.arange(radius_count) * radius_step
+    scans = np.array([(h[0], h[3], h[4], h[5], h[6]) for h in (headers[i] for i in order)], dtype=SCAN_DTYPE)
+
+    cube = create_cube(directory, scans, lambdas, radius, cell, channel, chunks=chunks)
+    for s, i in enumerate(order):
+        if headers[i][10] != lambdas or headers[i][7] != radius_count:
+            raise ValueError(f"{files[i]} doesn't match the wavelengths and radii of {files[order[0]]}")
+        cube[s, :] = read_mwrs(files[i], mmap=True)[12] / 10000
+    cube.flush()
+    return cube
+
+
+def cube_from_mw(directory, files, chunks: tuple[int, int] = DEFAULT_CHUNKS) -> MwCube:
+    """Build a cube from the .MW files of one cell and channel, one file per scan
+
+    The radii of .MW files are in mm, they are converted to cm like the radius of the other builders.
+    """
+    headers = sorted((read_mw(filename, header_only=True) | {'filename': filename} for filename in files),
+                     key=lambda header: header['scan'])
+    first = headers[0]
+    radius = np.linspace(first['radius_start'], first['radius_end'], first['radius_count']) / 10
+    scans = np.array([(h['scan'], h['temperature'], h['speed'], h['seconds'], h['w2t']) for h in headers],
+                     dtype=SCAN_DTYPE)
+
+    cube = create_cube(directory, scans, first['lambdas'], radius, first['cell'], first['channel'], first['sample'],
+                       chunks)
+    for s, header in enumerate(headers):
+        if header['lambdas'] != first['lambdas'] or header['radius_count'] != first['radius_count']:
+            raise ValueError(f"{header['filename']} doesn't match the wavelengths and radii of {first['filename']}")
+        cube[s, :] = read_mw(header['filename'])['intensity']
+    cube.flush()
+    return cube
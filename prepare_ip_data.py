@@ -1,3 +1,4 @@
+import io
 import os
 import argparse
 import sys
@@ -5,6 +6,11 @@ import glob
 import numpy as np
 from pathlib import Path
 
+from read_ip import parse_ip_columns
+
+# scans loaded and fitted at once, bounds the memory used for the output lines of a group
+BATCH_SIZE = 256
+
 def get_args():
     parser = argparse.ArgumentParser(description='Process raw text file matching *.IP from a directory')
     parser.add_argument('--input_dir', type=str, help='Directory containing the input *.IP files')
@@ -29,67 +35,102 @@ def get_args():
 
     return args
 
-def process_ip_file(file_path, nth, output_dir):
+def load_ip_file(file_path, nth, output_dir):
+    """Read an .IP file, drop every nth data line and return the kept radii and readings with the output content"""
     try:
-        with open(file_path, 'r') as f:
-            lines = f.readlines()
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        lines = io.StringIO(content.decode(), newline=None).readlines()
+        if len(lines) < 2:
+            return None
+        radius, reading = parse_ip_columns(content)
     except Exception as e:
         print(f"Error reading {file_path}: {e}")
-        return None, None
-
-    if len(lines) < 2:
-        return None, None
+        return None
 
     header = lines[:2]
     data_lines = lines[2:]
 
     # Exclude every nth line from data_lines (1-indexed exclusion)
     # If nth = 2, we exclude lines 2, 4, 6... (0-indexed indices 1, 3, 5...)
-    filtered_data_lines = [line for i, line in enumerate(data_lines) if (i + 1) % nth != 0]
-
-    # Parse radius and reading for linear regression
-    radii = []
-    readings = []
-    for line in filtered_data_lines:
-        parts = line.strip().split()
-        if len(parts) >= 2:
-            try:
-                radii.append(float(parts[0]))
-                readings.append(float(parts[-1]))
-            except ValueError:
-                continue
-
-    if not radii:
-        return None, None
+    keep = (np.arange(len(data_lines)) + 1) % nth != 0
+    filtered_data_lines = [line for line, k in zip(data_lines, keep) if k]
 
-    # Slope and intersect should only be fitted for the 50% to 80% of the radial domain
-    r_min = min(radii)
-    r_max = max(radii)
-    r_range = r_max - r_min
-    
-    r_start = r_min + 0.50 * r_range
-    r_end = r_min + 0.80 * r_range
-    
-    fit_radii = []
-    fit_readings = []
-    for r, v in zip(radii, readings):
-        if r_start <= r <= r_end:
-            fit_radii.append(r)
-            fit_readings.append(v)
-            
-    if not fit_radii:
-        # Fallback to full data if domain is too small or no points in range
-        # Although with 30% of the range, there should be points if the distribution is decent.
-        fit_radii, fit_readings = radii, readings
-
-    # Linear regression: y = mx + c
-    slope, intercept = np.polyfit(fit_radii, fit_readings, 1)
+    # Radius and reading of the kept lines for linear regression, lines that couldn't be parsed are NaN
+    count = min(len(keep), len(radius))
+    keep = keep[:count] & ~(np.isnan(radius[:count]) | np.isnan(reading[:count]))
+    if not keep.any():
+        return None
 
     # Prepare the output file content
     output_content = header + filtered_data_lines
     output_path = Path(output_dir) / Path(file_path).name
 
-    return slope, (output_path, output_content)
+    return radius[:count][keep], reading[:count][keep], (output_path, output_content)
+
+
+def fit_slopes(radii, readings):
+    """Fit slope and intercept of every scan at once by closed-form least squares
+
+    radii and readings are (scan, point) matrices padded with NaN. Slope and intersect are only fitted for the 50% to
+    80% of the radial domain of every scan, scans without points in that window are fitted on all their points.
+    """
+    valid = ~(np.isnan(radii) | np.isnan(readings))
+    r_min = np.nanmin(radii, axis=1, keepdims=True)
+    r_max = np.nanmax(radii, axis=1, keepdims=True)
+    r_range = r_max - r_min
+    with np.errstate(invalid='ignore'):
+        window = valid & (radii >= r_min + 0.50 * r_range) & (radii <= r_min + 0.80 * r_range)
+    # Fallback to full data if domain is too small or no points in range
+    window = np.where(window.any(axis=1, keepdims=True), window, valid)
+
+    # Linear regression: y = mx + c, on centered values for numerical stability
+    n = window.sum(axis=1)
+    x = np.where(window, radii, 0.0)
+    y = np.where(window, readings, 0.0)
+    x_mean = x.sum(axis=1) / n
+    y_mean = y.sum(axis=1) / n
+    dx = np.where(window, radii - x_mean[:, None], 0.0)
+    dy = np.where(window, readings - y_mean[:, None], 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slopes = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+    intercepts = y_mean - slopes * x_mean
+    return slopes, intercepts
+
+
+def stack_scans(columns):
+    """Stack 1-D arrays of different lengths into a NaN padded matrix"""
+    matrix = np.full((len(columns), max((len(column) for column in columns), default=0)), np.nan)
+    for row, column in enumerate(columns):
+        matrix[row, :len(column)] = column
+    return matrix
+
+
+def iter_group_slopes(group_files, nth, output_dir):
+    """Yield every file of a group with its slope and output, fitting BATCH_SIZE scans at once"""
+    for start in range(0, len(group_files), BATCH_SIZE):
+        batch = group_files[start:start + BATCH_SIZE]
+        loaded = [load_ip_file(file_path, nth, output_dir) for file_path in batch]
+        scans = [scan for scan in loaded if scan is not None]
+        slopes = iter([])
+        if scans:
+            slopes = iter(fit_slopes(stack_scans([scan[0] for scan in scans]),
+                                     stack_scans([scan[1] for scan in scans]))[0].tolist())
+        for file_path, scan in zip(batch, loaded):
+            if scan is None:
+                yield file_path, None, None
+            else:
+                yield file_path, next(slopes), scan[2]
+
+
+def process_ip_file(file_path, nth, output_dir):
+    loaded = load_ip_file(file_path, nth, output_dir)
+    if loaded is None:
+        return None, None
+    radii, readings, result = loaded
+    slopes, _ = fit_slopes(radii[None, :], readings[None, :])
+    return slopes[0], result
+
 
 def main():
     args = get_args()
@@ -131,9 +172,8 @@ def main():
         # Sort files within the group to process scans in chronological order
         group_files.sort()
         
-        for file_path in group_files:
+        for file_path, slope, result in iter_group_slopes(group_files, nth, output_dir):
             total_files_processed += 1
-            slope, result = process_ip_file(file_path, nth, output_dir)
             if slope is None:
                 continue
             change = -200
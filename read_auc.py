@@ -1,138 +1,382 @@
 import struct
+
+import numpy as np
+
+from auc_cache import get_cache
+
 FORMAT_VERSION = 5
+EXPERIMENT_TYPES = ["RA", "IP", "RI", "FI", "WA", "WI"]
+# file header: magic, version, type, cell, channel, rawGUID, description, min_radius, unused, delta_radius,
+# min_data1, max_data1, min_data2, max_data2, scan_count (all little endian)
+HEADER_STRUCT = struct.Struct('<4s2s2sBc16s240s7fh')
+# scan header: DATA, temperature, rpm, seconds, omega2t, raw wavelength, delta_r, value_count
+SCAN_STRUCT = struct.Struct('<4sffifhfi')
+# bit order of the interpolation bitmask, the first value of a byte is stored in its most significant bit
+BITORDER = 'big'
+# per-scan metadata columns of AucData
+SCAN_DTYPE = np.dtype([('temperature', np.float32), ('rpm', np.float32), ('seconds', np.int32),
+                       ('omega2t', np.float32), ('wavelength', np.float64), ('delta_r', np.float32),
+                       ('value_count', np.int32)])
 
-def read_auc(filename: str):
-    data = {}
-    # Open the file and read the data
+
+def _parse_header(buffer) -> dict:
+    """Parse the 296 byte file header of an auc file"""
+    (magic, version_data, type_data, cell, channel, _, description, min_radius, _, delta_radius,
+     min_data1, max_data1, min_data2, max_data2, scan_count) = HEADER_STRUCT.unpack_from(buffer)
+    # verify we read UltraScan Data
+    if magic != b'UCDA':
+        raise ValueError("No UltraScan data")
+    version_data = int(version_data.decode())
+    if version_data > FORMAT_VERSION:
+        raise ValueError("Bad version")
+    type_data = type_data.decode()
+    if type_data not in EXPERIMENT_TYPES:
+        raise ValueError("Invalid type")
+    return {
+        'version': version_data,
+        'type': type_data,
+        'cell': cell,
+        'channel': channel.decode(),
+        'description': description.decode().strip('\x00'),
+        'min_radius': min_radius,
+        'delta_radius': delta_radius,
+        'min_data1': min_data1,
+        'max_data1': max_data1,
+        'min_data2': min_data2,
+        'max_data2': max_data2,
+        # quantization steps of the readings and the standard deviations
+        'factor1': (max_data1 - min_data1) / 65535.0,
+        'factor2': (max_data2 - min_data2) / 65535.0,
+        # standard deviations are only stored if their range is set
+        'nz_stddev': min_data2 != 0.0 or max_data2 != 0.0,
+        'scan_count': scan_count,
+    }
+
+
+def _parse_scan_header(buffer, offset: int, header: dict) -> dict:
+    """Parse the 30 byte header of the scan starting at offset"""
+    (type_data, temperature, rpm, seconds, omega2t, raw_wavelength, delta_r,
+     value_count) = SCAN_STRUCT.unpack_from(buffer, offset)
+    if type_data != b'DATA':
+        raise ValueError("Not UltraScan data")
+    # version number defines wavelength format
+    if header['version'] > 4:
+        wavelength = raw_wavelength / 10
+    else:
+        wavelength = raw_wavelength / 100 + 180
+    return {
+        'temperature': temperature,
+        'rpm': rpm,
+        'seconds': seconds,
+        'omega2t': omega2t,
+        'wavelength': wavelength,
+        'delta_r': delta_r,
+        'value_count': value_count,
+    }
+
+
+def _scan_size(value_count: int, header: dict) -> int:
+    """Number of bytes of a scan including its header, values and interpolation bitmask"""
+    channels = 2 if header['nz_stddev'] else 1
+    return SCAN_STRUCT.size + 2 * channels * value_count + (value_count + 7) // 8
+
+
+def _dequantize(raw: np.ndarray, min_data: float, factor: float) -> np.ndarray:
+    """Convert quantized unsigned 16bit values into float32 values"""
+    values = raw.astype(np.float32)
+    values *= factor
+    values += min_data
+    return values
+
+
+def pack_interpolated(mask, bitorder: str = BITORDER) -> np.ndarray:
+    """Pack a boolean interpolation mask along its last axis into (value_count+7)//8 bytes"""
+    return np.packbits(np.asarray(mask, dtype=bool), axis=-1, bitorder=bitorder)
+
+
+def unpack_interpolated(packed, value_count: int, bitorder: str = BITORDER) -> np.ndarray:
+    """Unpack an interpolation bitmask along its last axis into a boolean mask of value_count entries"""
+    bits = np.unpackbits(np.asarray(packed, dtype=np.uint8), axis=-1, count=value_count, bitorder=bitorder)
+    return bits.view(bool)
+
+
+def _decode_scan(buffer, offset: int, header: dict) -> tuple[dict, int]:
+    """Decode the scan starting at offset and return it together with the offset of the next scan"""
+    scan = _parse_scan_header(buffer, offset, header)
+    value_count = scan['value_count']
+    channels = 2 if header['nz_stddev'] else 1
+    offset += SCAN_STRUCT.size
+    # readings and standard deviations are stored interleaved as unsigned little endian 16bit pairs
+    raw = np.frombuffer(buffer, dtype='<u2', count=value_count * channels, offset=offset)
+    raw = raw.reshape(value_count, channels)
+    offset += raw.nbytes
+    scan['reading_values'] = _dequantize(raw[:, 0], header['min_data1'], header['factor1'])
+    if header['nz_stddev']:
+        scan['stddevs'] = _dequantize(raw[:, 1], header['min_data2'], header['factor2'])
+    else:
+        scan['stddevs'] = None
+    # (value_count+7)/8 bytes which are a bitmask indicating if the position was interpolated or not, kept packed
+    mask_size = (value_count + 7) // 8
+    scan['interpolated'] = np.frombuffer(buffer, dtype=np.uint8, count=mask_size, offset=offset).copy()
+    return scan, offset + mask_size
+
+
+def decode_auc(filename: str) -> dict:
+    """Decode an auc file into its header and a list of scans holding float32 arrays"""
+    with open(filename, 'rb') as f:
+        buffer = f.read()
+    data = _parse_header(buffer)
+    data['scans'] = []
+    offset = HEADER_STRUCT.size
+    for _ in range(data['scan_count']):
+        scan, offset = _decode_scan(buffer, offset, data)
+        data['scans'].append(scan)
+    return data
+
+
+def iter_auc_scans(filename: str):
+    """Yield the decoded scans of an auc file one at a time, only a single scan is held in memory"""
     with open(filename, 'rb') as f:
-        # read magic string 4 bytes and decode it to utf8 to verify we read UltraScan Data
-        magic = f.read(4).decode()
-        if magic != 'UCDA':
-            assert "No UltraScan data"
-        # read version number 2 bytes and decode it to utf8
-        version_data = f.read(2).decode()
-        try:
-            version_data = int(version_data)
-        except Exception as e:
-            raise e
-        # check for version number
-        if version_data > FORMAT_VERSION:
-            assert "Bad version"
-        data["version"] = version_data
-        # version number defines wavelength format
-        if version_data > 4:
-            wvlf_new = True
+        header = _parse_header(f.read(HEADER_STRUCT.size))
+        for _ in range(header['scan_count']):
+            scan_header = f.read(SCAN_STRUCT.size)
+            value_count = _parse_scan_header(scan_header, 0, header)['value_count']
+            payload = f.read(_scan_size(value_count, header) - SCAN_STRUCT.size)
+            yield _decode_scan(scan_header + payload, 0, header)[0]
+
+
+def read_auc_header(filename: str) -> dict:
+    """Read the file header and the metadata of every scan without touching the readings"""
+    # unbuffered, so only the headers are read from disk and the readings are skipped by seeking
+    with open(filename, 'rb', buffering=0) as f:
+        data = _parse_header(f.read(HEADER_STRUCT.size))
+        data['scanData'] = []
+        offset = HEADER_STRUCT.size
+        for _ in range(data['scan_count']):
+            f.seek(offset)
+            scan = _parse_scan_header(f.read(SCAN_STRUCT.size), 0, data)
+            data['scanData'].append(scan)
+            # skip the readings, standard deviations and interpolation bitmask using the value count
+            offset += _scan_size(scan['value_count'], data)
+    return data
+
+
+def read_auc(filename: str):
+    """Read an auc file into nested dicts and lists of floats"""
+    auc = load_auc(filename)
+    data = {
+        'version': auc.version,
+        'type': auc.experiment_type,
+        'cell': auc.cell,
+        'channel': auc.channel,
+        'description': auc.description,
+        'min_radius': auc.min_radius,
+        'delta_radius': auc.delta_radius,
+        'scan_count': len(auc),
+    }
+    data["scanData"] = []
+    nz_stddev = auc.stddevs is not None
+    interpolated = auc.interpolated_mask().view(np.uint8)
+    value_count = 0
+    for i, scan in enumerate(auc.scans.tolist()):
+        scan = dict(zip(SCAN_DTYPE.names, scan))
+        value_count = scan.pop('value_count')
+        data['valueCount'] = value_count
+        scan['reading_values'] = auc.readings[i, :value_count].tolist()
+        scan['stddevs'] = auc.stddevs[i, :value_count].tolist() if nz_stddev else []
+        scan['nz_stddev'] = nz_stddev
+        scan['interpolated'] = interpolated[i, :value_count].tolist()
+        data["scanData"].append(scan)
+    # construct radius vector
+    data["radius"] = (auc.delta_radius * np.arange(value_count) + auc.min_radius).tolist()
+    return data
+
+
+class AucFile:
+    """Memory mapped auc file giving random access to single scans without decoding the whole file
+
+    ``auc[i]`` decodes only scan i, ``auc[i:j]`` returns a read-only zero-copy view of the quantized values of the
+    selected scans with the shape (scans, value_count, channels), where the second channel holds the quantized
+    standard deviations if the file contains them.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._buffer = np.memmap(filename, dtype=np.uint8, mode='r')
+        self.header = _parse_header(self._buffer)
+        # scan the DATA headers once to build the scan offset table
+        self.scans = []
+        offset = HEADER_STRUCT.size
+        for _ in range(self.header['scan_count']):
+            scan = _parse_scan_header(self._buffer, offset, self.header)
+            scan['offset'] = offset
+            self.scans.append(scan)
+            offset += _scan_size(scan['value_count'], self.header)
+        if offset > self._buffer.size:
+            raise ValueError(f"File {filename} is truncated")
+
+    def __len__(self) -> int:
+        return len(self.scans)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._raw_view(key)
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError(f"scan index {key} out of range")
+        return _decode_scan(self._buffer, self.scans[key]['offset'], self.header)[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Drop the reference to the memory map, views returned by slicing stay valid"""
+        self._buffer = None
+
+    @property
+    def radius(self) -> np.ndarray:
+        """Radius vector of the scans"""
+        value_count = self.scans[0]['value_count'] if self.scans else 0
+        return self.header['delta_radius'] * np.arange(value_count) + self.header['min_radius']
+
+    def load(self) -> 'AucData':
+        """Decode all scans into an array backed AucData container"""
+        header = self.header
+        scans = np.array([tuple(scan[name] for name in SCAN_DTYPE.names) for scan in self.scans], dtype=SCAN_DTYPE)
+        value_count = int(scans['value_count'].max()) if len(scans) else 0
+        mask_size = (value_count + 7) // 8
+        # shorter scans are padded with NaN
+        readings = np.full((len(self), value_count), np.nan, dtype=np.float32)
+        stddevs = np.full((len(self), value_count), np.nan, dtype=np.float32) if header['nz_stddev'] else None
+        interpolated = np.zeros((len(self), mask_size), dtype=np.uint8)
+        if len(scans) and (scans['value_count'] == value_count).all():
+            # all scans share one layout, dequantize the whole file at once from the strided raw view
+            raw = self[:]
+            readings[:] = _dequantize(raw[..., 0], header['min_data1'], header['factor1'])
+            if stddevs is not None:
+                stddevs[:] = _dequantize(raw[..., 1], header['min_data2'], header['factor2'])
+            interpolated[:] = np.ndarray((len(self), mask_size), dtype=np.uint8, buffer=self._buffer,
+                                         offset=self.scans[0]['offset'] + SCAN_STRUCT.size + raw[0].nbytes,
+                                         strides=(_scan_size(value_count, header), 1))
         else:
-            wvlf_new = False
-        # read type of experiment 2 bytes and decode it to utf8
-        type_data = f.read(2).decode()
-        if type_data not in ["RA", "IP", "RI", "FI", "WA", "WI"]:
-            assert "Invalid type"
-        data["type"] = type_data
-        # read 1 byte for cell number
-        cell_raw = f.read(1)
-        # convert byte in little endian format to unsigned integer
-        data["cell"] = int.from_bytes(cell_raw, 'little', signed=False)
-        # read 1 byte for channel
-        data["channel"] = f.read(1).decode()
-        tmp = f.read(16) # read rawGUID UltraScan internal
-        # read 240 bytes description, filled with \x00
-        data["description"] = f.read(240).decode().strip('\x00')
-        # read 4 bytes as little endian float
-        min_radius = struct.unpack('f', f.read(4))[0]
-        data["min_radius"] = min_radius
-        f.read(4) # unused data
-        # read 4 bytes as little endian float
-        delta_radius = struct.unpack('f',f.read(4))[0]
-        data["delta_radius"] = delta_radius
-        # read 4 bytes as little endian float
-        min_data1 = struct.unpack('f',f.read(4))[0]
-        # read 4 bytes as little endian float
-        max_data1 = struct.unpack('f',f.read(4))[0]
-        # read 4 bytes as little endian float
-        min_data2 = struct.unpack('f',f.read(4))[0]
-        # read 4 bytes as little endian float
-        max_data2 = struct.unpack('f',f.read(4))[0]
-        # read 2 bytes as little endian int signed
-        scan_count = int.from_bytes(f.read(2), 'little', signed=True)
-        data["scan_count"] = scan_count
-        data["scanData"] = []
-        # read every scan
-        read_bytes = 0
-        for i in range(0, scan_count):
-            read_bytes_before = read_bytes
-            # read 4 bytes type to verify we are in DATA range
-            type_data = f.read(4).decode()
-            read_bytes += 4
-            if type_data != "DATA":
-                assert "Not UltraScan data"
-            scan = {}
-            # read 4 bytes as little endian float
-            scan['temperature'] = struct.unpack('f',f.read(4))[0]
-            read_bytes += 4
-            # read 4 bytes as little endian float
-            scan['rpm'] = struct.unpack('f',f.read(4))[0]
-            read_bytes += 4
-            # read 4 bytes as little endian int
-            scan['seconds'] = int.from_bytes(f.read(4), 'little', signed=True)
-            read_bytes += 4
-            # read 4 bytes as little endian float
-            scan['omega2t'] = struct.unpack('f',f.read(4))[0]
-            read_bytes += 4
-            # read 2 bytes as signed little endian int and calculate wavelength from it
-            if wvlf_new:
-                wavelength = int.from_bytes(f.read(2),'little', signed=True) / 10
-            else:
-                wavelength = int.from_bytes(f.read(2), 'little', signed=True) / 100 + 180
-            scan['wavelength'] = wavelength
-            read_bytes += 2
-            # read 4 bytes as little endian float
-            scan['delta_r'] = struct.unpack('f',f.read(4))[0]
-            read_bytes += 4
-            # read 4 bytes as little endian int
-            value_count = int.from_bytes(f.read(4), 'little', signed=True)
-            read_bytes += 4
-            data['valueCount'] = value_count
-            factor1 = (max_data1 - min_data1) / 65535.0
-            factor2 = (max_data2 - min_data2) / 65535.0
-            stdDev = min_data2 != 0.0 or max_data2 != 0.0
-            reading_values = []
-            stddevs = []
-            read_bytes_middle = read_bytes
-            # print(f"Before Reading {read_bytes_middle- read_bytes_before} bytes for scan {i}")
-            for j in range(0, value_count):
-                # read 2 bytes as unsigned little endian int
-                reading_value = min_data1 + factor1 * int.from_bytes(f.read(2), 'little', signed=False)
-                read_bytes += 2
-                if stdDev:
-                    # read 2 bytes as unsigned little endian int
-                    sval = min_data2 + factor2 * int.from_bytes(f.read(2), 'little', signed=False)
-                    read_bytes += 2
-                else:
-                    sval = 0.0
-                # append read values to data
-                reading_values.append(reading_value)
-                stddevs.append(sval)
-            # print(f"After Reading {read_bytes - read_bytes_middle} bytes for scan {i}")
-            
-            scan["reading_values"] = reading_values
-            if stdDev:
-                scan["stddevs"] = stddevs
-                scan["nz_stddev"] = True
-            else:
-                scan["stddevs"] = []
-                scan["nz_stddev"] = False
-            # read (value_count+7)/8 bytes which are a Bytearray indicating if the position was interpolated or not
-            interpolated = f.read((value_count+7)//8)
-            read_bytes += (value_count+7)//8
-            scan['interpolated'] = [byte & 1 for byte in bytearray(interpolated)]
-            data["scanData"].append(scan)
-            read_bytes_after = read_bytes
-            # print(f"End Scan {read_bytes_after - read_bytes_before} bytes for scan {i}")
-
-        # construct radius vector
-        radius = []
-        for j in range(0, value_count):
-            radius.append(delta_radius * j + min_radius)
-        data["radius"] = radius
+            for i, scan in enumerate(self):
+                readings[i, :scan['value_count']] = scan['reading_values']
+                if stddevs is not None:
+                    stddevs[i, :scan['value_count']] = scan['stddevs']
+                interpolated[i, :len(scan['interpolated'])] = scan['interpolated']
+        return AucData(header['cell'], header['channel'], header['description'], header['min_radius'],
+                       header['delta_radius'], scans, readings, stddevs, interpolated, header['version'],
+                       header['type'])
+
+    def _raw_view(self, key: slice) -> np.ndarray:
+        """Zero-copy strided view on the quantized values of the scans selected by key"""
+        channels = 2 if self.header['nz_stddev'] else 1
+        indices = range(*key.indices(len(self)))
+        if not indices:
+            return np.empty((0, 0, channels), dtype='<u2')
+        if indices.step < 0:
+            return self._raw_view(slice(indices[-1], indices[0] + 1, -indices.step))[::-1]
+        value_count = self.scans[indices[0]]['value_count']
+        if any(self.scans[i]['value_count'] != value_count for i in indices):
+            raise ValueError("Scans with different value counts can not be viewed as one block")
+        # all scans in between share the same layout, so the values are regularly strided in the file
+        stride = indices.step * _scan_size(value_count, self.header)
+        return np.ndarray((len(indices), value_count, channels), dtype='<u2', buffer=self._buffer,
+                          offset=self.scans[indices[0]]['offset'] + SCAN_STRUCT.size,
+                          strides=(stride, 2 * channels, 2))
+
+
+def _float_matrix(values) -> np.ndarray:
+    """Readings or stddevs as float32 matrix, float64 matrices are kept"""
+    values = np.asarray(values)
+    return values if values.dtype == np.float64 else values.astype(np.float32, copy=False)
+
+
+class AucData:
+    """Compact array backed content of an auc file
+
+    readings and stddevs are float32 matrices of the shape (scans, radii), shorter scans are padded with NaN. float64
+    matrices are kept as they are, so write_auc quantizes them without rounding to float32 first.
+    interpolated holds the packed interpolation bitmask of every scan and scans the per-scan metadata as structured
+    array with the columns of SCAN_DTYPE.
+    """
+    __slots__ = ('cell', 'channel', 'description', 'min_radius', 'delta_radius', 'scans', 'readings', 'stddevs',
+                 'interpolated', 'version', 'experiment_type')
+
+    def __init__(self, cell: int, channel: str, description: str, min_radius: float, delta_radius: float,
+                 scans: np.ndarray, readings: np.ndarray, stddevs: np.ndarray | None = None,
+                 interpolated: np.ndarray | None = None, version: int = FORMAT_VERSION, experiment_type: str = 'IP'):
+        readings = _float_matrix(readings)
+        if readings.ndim != 2 or readings.shape[0] != len(scans):
+            raise ValueError("readings must be a matrix with one row per scan")
+        if stddevs is not None:
+            stddevs = _float_matrix(stddevs)
+            if stddevs.shape != readings.shape:
+                raise ValueError("stddevs must have the same shape as readings")
+        if interpolated is not None:
+            interpolated = np.asarray(interpolated, dtype=np.uint8)
+            if interpolated.shape != (readings.shape[0], (readings.shape[1] + 7) // 8):
+                raise ValueError("interpolated must hold a packed bitmask of every scan")
+        self.cell = cell
+        self.channel = channel
+        self.description = description
+        self.min_radius = min_radius
+        self.delta_radius = delta_radius
+        self.scans = np.asarray(scans, dtype=SCAN_DTYPE)
+        self.readings = readings
+        self.stddevs = stddevs
+        self.interpolated = interpolated
+        self.version = version
+        self.experiment_type = experiment_type
+
+    def __len__(self) -> int:
+        return len(self.scans)
+
+    def __repr__(self) -> str:
+        return (f"AucData(type={self.experiment_type!r}, cell={self.cell}, channel={self.channel!r}, "
+                f"scans={self.readings.shape[0]}, radii={self.readings.shape[1]})")
+
+    @property
+    def radius(self) -> np.ndarray:
+        """Radius vector of the reading matrix columns"""
+        return self.delta_radius * np.arange(self.readings.shape[1]) + self.min_radius
+
+    def interpolated_mask(self, bitorder: str = BITORDER) -> np.ndarray:
+        """Unpack the interpolation bitmask into a boolean matrix of the shape of readings"""
+        if self.interpolated is None:
+            return np.zeros(self.readings.shape, dtype=bool)
+        return unpack_interpolated(self.interpolated, self.readings.shape[1], bitorder)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the arrays of the container"""
+        arrays = (self.scans, self.readings, self.stddevs, self.interpolated)
+        return sum(array.nbytes for array in arrays if array is not None)
+
+
+def load_auc(filename: str) -> AucData:
+    """Read an auc file into a compact array backed AucData container
+
+    If the decoded-auc cache is enabled, a cached copy is memory mapped instead of decoding the file.
+    """
+    cache = get_cache()
+    if cache is not None:
+        cached = cache.get(filename)
+        if cached is not None:
+            meta, arrays = cached
+            return AucData(**meta, **arrays)
+    with AucFile(filename) as auc:
+        data = auc.load()
+    if cache is not None:
+        arrays = ('scans', 'readings', 'stddevs', 'interpolated')
+        cache.put(filename, {name: getattr(data, name) for name in AucData.__slots__ if name not in arrays},
+                  {name: getattr(data, name) for name in arrays})
     return data
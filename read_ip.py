@@ -0,0 +1,101 @@
+import numpy as np
+
+# second header line of an .IPn file: type, cell, temperature, speed, seconds, omega2t, wavelength and a count the
+# converters don't use
+HEADER_DTYPE = np.dtype([
+    ('description', 'U240'),
+    ('data_type', 'U8'),
+    ('cell', '<i4'),
+    ('temperature', '<f8'),
+    ('speed', '<i4'),
+    ('seconds', '<i4'),
+    ('omega2t', '<f8'),
+    ('wavelength', '<i4'),
+    ('count', 'U16'),
+])
+# bytes np.fromstring treats as separators
+_WHITESPACE = np.zeros(256, dtype=bool)
+_WHITESPACE[list(b' \t\n\r\x0b\x0c')] = True
+
+
+def parse_ip_header(lines: list[str]) -> np.record:
+    """Parse the two header lines of an .IPn file into a HEADER_DTYPE record"""
+    description = lines[0].strip()
+    if ', ' in description:
+        description = description.split(', ')[1]
+    [data_type, cell, temperature, speed, seconds, omega2t, wavelength, count] = lines[1].split()
+    header = np.rec.array([(description, data_type, int(cell), float(temperature), int(speed), int(seconds),
+                            float(omega2t), int(wavelength), count)], dtype=HEADER_DTYPE)
+    return header[0]
+
+
+def _parse_lines(lines: list[bytes]) -> np.ndarray:
+    """Parse the data lines one by one, lines without a radius and a reading become NaN rows"""
+    data = np.full((len(lines), 2), np.nan)
+    for i, line in enumerate(lines):
+        parts = line.split()
+        if len(parts) >= 2:
+            try:
+                data[i] = float(parts[0]), float(parts[-1])
+            except ValueError:
+                continue
+    return data
+
+
+def _tokens_per_line(body: bytes) -> np.ndarray:
+    """Number of whitespace separated tokens on every line of body"""
+    chars = np.frombuffer(body, dtype=np.uint8)
+    space = _WHITESPACE[chars]
+    starts = np.flatnonzero(~space & np.r_[True, space[:-1]])
+    ends = np.flatnonzero(chars == ord('\n'))
+    if not body.endswith(b'\n'):
+        ends = np.r_[ends, len(chars)]
+    return np.diff(np.searchsorted(starts, ends), prepend=0)
+
+
+def parse_ip_columns(content: bytes) -> tuple[np.ndarray, np.ndarray]:
+    """Parse the radius and reading columns of an .IPn file, the two header lines are skipped without parsing them
+
+    The data lines are tokenized at once in C by np.fromstring, the radius is the first and the reading the last column.
+    Files with ragged or malformed lines are parsed line by line, keeping one NaN row per line that can't be parsed,
+    so the rows always match the data lines of the file.
+    """
+    lines = content.split(b'\n', 2)
+    body = lines[2] if len(lines) > 2 else b''
+    if not body:
+        return np.empty(0), np.empty(0)
+    line_count = body.count(b'\n') + (not body.endswith(b'\n'))
+    columns = len(body.split(b'\n', 1)[0].split())
+    values = np.empty(0)
+    if columns >= 2 and np.all(_tokens_per_line(body) == columns):
+        try:
+            values = np.fromstring(body.decode(), sep=' ')
+        except ValueError:
+            # a token that isn't a number
+            pass
+    if values.size == columns * line_count:
+        values = values.reshape(line_count, columns)
+        return values[:, 0], values[:, -1]
+    data = _parse_lines(body.splitlines())
+    return data[:, 0], data[:, 1]
+
+
+def parse_ip(content: bytes) -> tuple[np.record, np.ndarray, np.ndarray]:
+    """Parse the content of an .IPn file into its header record and the radius and reading columns"""
+    lines = content.split(b'\n', 2)
+    if len(lines) < 2:
+        raise ValueError("IP file has no header")
+    header = parse_ip_header([line.decode() for line in lines[:2]])
+    return header, *parse_ip_columns(content)
+
+
+def read_ip(filename) -> tuple[np.record, np.ndarray, np.ndarray]:
+    """Read an .IPn file into its header record and the radius and reading columns"""
+    with open(filename, 'rb') as f:
+        return parse_ip(f.read())
+
+
+def read_ip_columns(filename) -> tuple[np.ndarray, np.ndarray]:
+    """Read the radius and reading columns of an .IPn file, the header isn't parsed"""
+    with open(filename, 'rb') as f:
+        return parse_ip_columns(f.read())
@@ -0,0 +1,46 @@
+import numpy as np
+
+from write_mw import HEADER_STRUCT
+
+
+def read_mw(filename: str, header_only: bool = False) -> dict:
+    """Read an .mw file
+
+    The intensities are exposed as read-only memory mapped big-endian uint32 matrix of the shape
+    (lambda_count, radius_count), so only the accessed parts are loaded. With header_only only the 100 byte header and
+    the lambda table are read, which is enough for cataloguing large MW directories.
+    """
+    with open(filename, 'rb') as f:
+        (magic_number, date_time, version, cell, channel, scan, sample, speed, temperature, w2t, seconds,
+         radius_count, radius_start, radius_end, lambda_count) = HEADER_STRUCT.unpack(f.read(HEADER_STRUCT.size))
+        lambdas = np.frombuffer(f.read(2 * lambda_count), dtype='>u2')
+
+    # Convert the stored integers back to the values passed to write_mw
+    data = {
+        'magic_number': magic_number,
+        'date_time': int.from_bytes(date_time, byteorder='big', signed=False),
+        'version': version,
+        'cell': cell,
+        'channel': channel.decode('ASCII'),
+        'scan': scan,
+        'sample': sample.decode().rstrip('\x00'),
+        'speed': speed,
+        'temperature': temperature / 10,
+        'w2t': w2t * 1000.0,
+        'seconds': seconds,
+        'radius_count': radius_count,
+        'radius_start': radius_start / 100,
+        'radius_end': radius_end / 100,
+        'lambdas': (lambdas / 10).tolist(),
+    }
+    if header_only:
+        return data
+
+    offset = HEADER_STRUCT.size + 2 * lambda_count
+    if lambda_count * radius_count == 0:
+        # an empty file region can't be memory mapped
+        data['intensity'] = np.zeros((lambda_count, radius_count), dtype='>u4')
+    else:
+        data['intensity'] = np.memmap(filename, dtype='>u4', mode='r', offset=offset,
+                                      shape=(lambda_count, radius_count))
+    return data
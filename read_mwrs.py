@@ -1,32 +1,41 @@
 import struct
 
-def read_mwrs(filename: str):
-    with open(filename, 'rb') as f:
-        data = f.read()
+import numpy as np
+
+# cell, channel, scan, set_speed, speed, temperature*10, omega2t, seconds, radius_count, radius_start*1000,
+# radius_step*10000, lambda_count (all big endian)
+HEADER_STRUCT = struct.Struct('>BcHHHhfiHHHH')
+
+
+def read_mwrs(filename: str, mmap: bool = False):
+    """Read an mwrs file
+
+    The intensities are returned as read-only (lambda_count, radius_count) big-endian int32 view on the file content
+    without copying it. With mmap the file is memory mapped instead of read, so only the accessed parts are loaded.
+    """
+    if mmap:
+        data = np.memmap(filename, dtype=np.uint8, mode='r')
+    else:
+        with open(filename, 'rb') as f:
+            data = f.read()
 
     # Reconstruct the header from the binary data
     (cell, channel, scan, set_speed, speed, temperature, omegat2, seconds, radius_count, radius_start, radius_step,
-     lambda_count) = struct.unpack('>BcHHHhfiHHHH', data[:26])
+     lambda_count) = HEADER_STRUCT.unpack_from(data)
     channel = channel.decode()
 
-    position = 26
+    position = HEADER_STRUCT.size
     # Read the wavelengths
-    lambdas = [struct.unpack('>H', data[position + 2 * i:position + 2 * (i + 1)])[0] for i in range(lambda_count)]
+    lambdas = np.frombuffer(data, dtype='>u2', count=lambda_count, offset=position).tolist()
     position += 2 * lambda_count
 
     # Read the intensities
-    intensity = []
-    for _ in lambdas:
-        intensities = []
-        for i in range(radius_count):
-            radius_struct = struct.unpack('>i', data[position + 4 * i:position + 4 * (i + 1)])
-            intensities.append(radius_struct[0])
-        position += 4 * radius_count
-        intensity.append(intensities)
+    intensity = np.frombuffer(data, dtype='>i4', count=lambda_count * radius_count, offset=position)
+    intensity = intensity.reshape(lambda_count, radius_count)
 
     # Convert temperature and radii back to original values
     temperature = temperature / 10
     radius_start = radius_start / 1000
     radius_step = radius_step / 10000
 
-    return cell, channel.decode(), scan, set_speed, speed, temperature, omegat2, seconds, radius_count, radius_start, radius_step, lambdas, intensity
+    return cell, channel, scan, set_speed, speed, temperature, omegat2, seconds, radius_count, radius_start, radius_step, lambdas, intensity
@@ -1,43 +1,80 @@
-import struct
+import os
 
-def read_tmst(filename):
+import numpy as np
+
+HEADER_SIZE = 6
+# one big endian record per time step, 24 bytes
+RECORD_DTYPE = np.dtype([
+    ('Time', '>u4'),  # I4
+    ('RawSpeed', '>f4'),  # F4
+    ('SetSpeed', '>u4'),  # I4
+    ('Omega2T', '>f4'),  # F4
+    ('Temperature', '>f4'),  # F4
+    ('Step', '>u2'),  # I2
+    ('Scan', '>u2'),  # I2
+])
+
+
+class TmstIndex:
+    """Lookup indexes of tmst records by time and scan number
+
+    Lookups take scalars or arrays and return record indices, so joining scans against the time state is a
+    searchsorted instead of a linear scan.
+    """
+
+    def __init__(self, records: np.ndarray):
+        times = records['Time']
+        # records are written in time order, only sort if a file isn't
+        if len(times) > 1 and (np.diff(times.astype(np.int64)) < 0).any():
+            self._time_order = np.argsort(times, kind='stable')
+        else:
+            self._time_order = None
+        self._times = times if self._time_order is None else times[self._time_order]
+        self._scan_order = np.argsort(records['Scan'], kind='stable')
+        self._scans = records['Scan'][self._scan_order]
+
+    def time_index(self, time):
+        """Index of the last record at or before time, -1 for times before the first record"""
+        position = np.searchsorted(self._times, time, side='right') - 1
+        if self._time_order is None:
+            return position
+        return np.where(position >= 0, self._time_order[np.maximum(position, 0)], -1)
+
+    def scan_index(self, scan):
+        """Index of the first record of a scan number, -1 for scans without records"""
+        if not len(self._scans):
+            return np.full(np.shape(scan), -1)
+        position = np.minimum(np.searchsorted(self._scans, scan, side='left'), len(self._scans) - 1)
+        return np.where(self._scans[position] == scan, self._scan_order[position], -1)
+
+    def scan_records(self, scan: int) -> np.ndarray:
+        """Indices of all records of a scan number in file order"""
+        start = np.searchsorted(self._scans, scan, side='left')
+        end = np.searchsorted(self._scans, scan, side='right')
+        return self._scan_order[start:end]
+
+
+def read_tmst(filename, mmap: bool = False):
+    """Read a tmst file, decoding all records at once into a structured array
+
+    With mmap the records are memory mapped instead of read. Records keep the field names Time, RawSpeed, SetSpeed,
+    Omega2T, Temperature, Step and Scan, a single record is accessed like before with records[i]['Time'].
+    """
     with open(filename, 'rb') as f:
         # Read header
         magic_number = f.read(4).decode('utf-8')
-        major_version = struct.unpack('>B', f.read(1))[0]
-        minor_version = struct.unpack('>B', f.read(1))[0]
-
-        # Assuming the rest of the header information (like time_count, constant_incr, etc.) is known beforehand or hard-coded
-
-        # Read data records
-        records = []
-        while True:
-            try:
-                time = struct.unpack('>I', f.read(4))[0]  # I4
-                raw_speed = struct.unpack('>f', f.read(4))[0]  # F4
-                set_speed = struct.unpack('>I', f.read(4))[0]  # I4
-                omega2T = struct.unpack('>f', f.read(4))[0]  # F4
-                temperature = struct.unpack('>f', f.read(4))[0]  # F4
-                step = struct.unpack('>H', f.read(2))[0]  # I2
-                scan = struct.unpack('>H', f.read(2))[0]  # I2
-
-                record = {
-                    'Time': time,
-                    'RawSpeed': raw_speed,
-                    'SetSpeed': set_speed,
-                    'Omega2T': omega2T,
-                    'Temperature': temperature,
-                    'Step': step,
-                    'Scan': scan
-                }
-                records.append(record)
-            except struct.error:
-                # End of file
-                break
+        major_version, minor_version = f.read(2)
+        # Read data records, an incomplete record at the end of the file is ignored
+        count = (os.fstat(f.fileno()).st_size - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        if mmap and count:
+            records = np.memmap(filename, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+        else:
+            records = np.frombuffer(f.read(count * RECORD_DTYPE.itemsize), dtype=RECORD_DTYPE)
 
     return {
         'MagicNumber': magic_number,
         'MajorVersion': major_version,
         'MinorVersion': minor_version,
-        'Records': records
+        'Records': records,
+        'Index': TmstIndex(records),
     }
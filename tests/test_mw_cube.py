@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from mw_cube import SCAN_DTYPE, create_cube
+
+
+@pytest.fixture
+def cube(tmp_path):
+    """5 scans x 4 wavelengths x 6 radii in chunks of (2, 3), so indices cross chunk borders"""
+    scans = np.zeros(5, dtype=SCAN_DTYPE)
+    scans['scan'] = np.arange(1, 6)
+    cube = create_cube(tmp_path / 'cube', scans, [250, 260, 270, 280], 5.8 + 0.01 * np.arange(6), 1, 'A',
+                       chunks=(2, 3))
+    expected = np.arange(5 * 4 * 6, dtype=np.float32).reshape(5, 4, 6)
+    for s in range(5):
+        cube[s, :] = expected[s]
+    return cube, expected
+
+
+@pytest.mark.parametrize('key', [
+    (slice(None), slice(None), 2),
+    (0, 0, 2),
+    (slice(None), 0, 2),
+    (1, slice(None), -1),
+    (slice(None), slice(None), slice(1, 4)),
+    (0, slice(1, 3), slice(None, None, 2)),
+    (slice(None), slice(None), [1, 2]),
+    (0, 0, [1, 2]),
+    (slice(None), 0, [1, 2]),
+    (3, slice(None), np.array([0, 5])),
+    (slice(None), [1, 3], [2, 3]),
+])
+def test_getitem_radius_key(cube, key):
+    cube, expected = cube
+    values = cube[key]
+    np.testing.assert_array_equal(values, expected[key[0], key[1]][..., key[2]])
+
+
+@pytest.mark.parametrize('key', [
+    (2, 1, 3),
+    (2, 1, slice(2, 5)),
+    (2, 1, [0, 4]),
+    (slice(None), 2, [1, 3]),
+    (slice(1, 4), slice(None), slice(None)),
+])
+def test_setitem_radius_key(cube, key):
+    cube, expected = cube
+    value = -np.ones_like(expected[key[0], key[1]][..., key[2]])
+    cube[key] = value
+    # scan and wavelength keys are ints or slices here, so this is a view into expected
+    expected[key[0], key[1]][..., key[2]] = value
+    np.testing.assert_array_equal(cube[:], expected)
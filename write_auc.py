@@ -1,47 +1,86 @@
-import struct
+import numpy as np
 
+from read_auc import AucData, EXPERIMENT_TYPES, HEADER_STRUCT, SCAN_DTYPE, SCAN_STRUCT, pack_interpolated
+
+
+def _quantization_range(values: np.ndarray) -> tuple[float, float]:
+	"""Global minimum and maximum of the values, ignoring the NaN padding of shorter scans"""
+	if not np.isfinite(values).any():
+		return 0.0, 0.0
+	return float(np.nanmin(values)), float(np.nanmax(values))
+
+
+def _quantize(values: np.ndarray, min_data: float, max_data: float) -> np.ndarray:
+	"""Convert values into unsigned 16bit steps between min_data and max_data"""
+	factor = (max_data - min_data) / 65535.0
+	if factor == 0.0:
+		return np.zeros(values.shape, dtype='<u2')
+	steps = np.nan_to_num((values.astype(np.float64) - min_data) / factor)
+	return np.clip(np.rint(steps), 0, 65535).astype('<u2')
+
+
+def write_auc_data(filename: str, data: AucData):
+	"""Write an AucData container as auc file, quantizing all scans in one vectorized pass"""
+	if data.experiment_type not in EXPERIMENT_TYPES:
+		raise ValueError(f"Invalid type {data.experiment_type}")
+	if len(data.channel) != 1:
+		raise ValueError("channel must be a single character")
+	min_data1, max_data1 = _quantization_range(data.readings)
+	if data.stddevs is not None:
+		min_data2, max_data2 = _quantization_range(data.stddevs)
+	else:
+		min_data2, max_data2 = 0.0, 0.0
+	# the reader only expects standard deviations if their range is set, all zero ones are dropped
+	nz_stddev = min_data2 != 0.0 or max_data2 != 0.0
+	quantized = _quantize(data.readings, min_data1, max_data1)
+	if nz_stddev:
+		# readings and standard deviations are stored interleaved per radius
+		quantized = np.stack((quantized, _quantize(data.stddevs, min_data2, max_data2)), axis=-1)
+	mask_size = (data.readings.shape[1] + 7) // 8
+	if data.interpolated is not None:
+		interpolated = data.interpolated
+	else:
+		interpolated = np.zeros((len(data), mask_size), dtype=np.uint8)
 
-def write_auc(filename: str, data: dict):
 	with open(filename, 'wb') as f:
-		f.write('UCDA'.encode('utf-8'))
-		f.write('05'.encode('utf-8'))
-		f.write('IP'.encode('utf-8'))
-		f.write(struct.pack('<B', data['cell']))
-		f.write('A'.encode())
-		f.write(bytes(16))  # rawGUID UltraScan internal, not used
-		description = data['description'].encode() + b'\x00' * (240 - len(data['description']))
-		f.write(description)
-		min_radius = min(data['radii'])
-		delta_radius = sum([scan['radius_step'] for scan in data['scanData']])/len(data['scanData'])
-		f.write(struct.pack('<f', min(data['radii'])))
-		f.write(struct.pack('<f', 0))  # unused data
-		f.write(struct.pack('<f', sum([scan['radius_step'] for scan in data['scanData']])/len(data['scanData'])))
-		min_data = min([min(scan['reading_values']) for scan in data['scanData']])
-		max_data = max([max(scan['reading_values']) for scan in data['scanData']])
-		f.write(struct.pack('<f', min_data))
-		f.write(struct.pack('<f', max_data))
-		f.write(struct.pack('<f', 0.0))
-		f.write(struct.pack('<f', 0.0))
-		f.write(struct.pack('<h', len(data['scanData'])))
-
-		for scan in data['scanData']:
-			f.write('DATA'.encode())
-			f.write(struct.pack('<f', scan['temperature']))
-			f.write(struct.pack('<f', scan['speed']))
-			f.write(struct.pack('<i', scan['seconds']))
-			f.write(struct.pack('<f', scan['omega2t']))
-			f.write(struct.pack('<h', scan['wavelength'] * 10))
-			f.write(struct.pack('<f', scan['radius_step']))
-			f.write(struct.pack('<i', len(scan['reading_values'])))
-
-			reading_values = scan['reading_values']
-
-			factor1 = (max_data - min_data) / 65535.0
-
-			for i in reading_values:
-				bval = round((i - min_data) / factor1)
-				f.write(struct.pack('<H', bval))
-
-			interpolated = [0] * ((len(reading_values) + 7) // 8)
-			byte_arr = bytes(bytearray(interpolated))
-			f.write(byte_arr)
\ No newline at end of file
+		f.write(HEADER_STRUCT.pack(b'UCDA', b'05', data.experiment_type.encode(), data.cell, data.channel.encode(),
+		                           bytes(16),  # rawGUID UltraScan internal, not used
+		                           data.description.encode()[:240], data.min_radius,
+		                           0.0,  # unused data
+		                           data.delta_radius, min_data1, max_data1, min_data2, max_data2, len(data)))
+		for i, scan in enumerate(data.scans):
+			value_count = int(scan['value_count'])
+			f.write(SCAN_STRUCT.pack(b'DATA', scan['temperature'], scan['rpm'], scan['seconds'], scan['omega2t'],
+			                         int(round(scan['wavelength'] * 10)), scan['delta_r'], value_count)
+			        + quantized[i, :value_count].tobytes()
+			        + interpolated[i, :(value_count + 7) // 8].tobytes())
+
+
+def write_auc(filename: str, data: dict):
+	"""Write the scans of a dict with cell, description, radii and scanData as auc file
+
+	reading_values and the optional stddevs and interpolated mask of every scan may be lists or NumPy arrays, the
+	interpolated mask holds one truth value per reading. The optional keys type and channel default to IP and A.
+	"""
+	scan_data = data['scanData']
+	value_count = max((len(scan['reading_values']) for scan in scan_data), default=0)
+	# shorter scans are padded with NaN, only their own values are written. The values are quantized from float64
+	readings = np.full((len(scan_data), value_count), np.nan, dtype=np.float64)
+	stddevs = None
+	if any(scan.get('stddevs') is not None and len(scan['stddevs']) for scan in scan_data):
+		stddevs = np.zeros((len(scan_data), value_count), dtype=np.float64)
+	interpolated = np.zeros((len(scan_data), value_count), dtype=bool)
+	scans = np.zeros(len(scan_data), dtype=SCAN_DTYPE)
+	for i, scan in enumerate(scan_data):
+		count = len(scan['reading_values'])
+		readings[i, :count] = scan['reading_values']
+		if stddevs is not None and scan.get('stddevs') is not None and len(scan['stddevs']):
+			stddevs[i, :count] = scan['stddevs']
+		if scan.get('interpolated') is not None:
+			interpolated[i, :count] = scan['interpolated']
+		scans[i] = (scan['temperature'], scan['speed'], scan['seconds'], scan['omega2t'], scan['wavelength'],
+		            scan['radius_step'], count)
+	delta_radius = sum(scan['radius_step'] for scan in scan_data) / len(scan_data)
+	write_auc_data(filename, AucData(data['cell'], data.get('channel', 'A'), data['description'],
+	                                 float(np.min(data['radii'])), delta_radius, scans, readings, stddevs,
+	                                 pack_interpolated(interpolated), experiment_type=data.get('type', 'IP')))
@@ -1,6 +1,12 @@
 import struct
 from typing import Sequence
 
+import numpy as np
+
+# magic, date/time, version, cell, channel, scan, sample, speed, temperature, w2t, seconds, radius_count,
+# radius_start, radius_end, lambda_count (all big endian)
+HEADER_STRUCT = struct.Struct(">I6sHBcH64sHHIIHHHH")
+
 
 def write_mw(
     magic_number: int,
@@ -18,8 +24,9 @@ def write_mw(
     radius_start: float,
     radius_end: float,
     lambdas: Sequence[int],
-    intensity_matrix: Sequence[Sequence[int]],
-) -> bytes:
+    intensity_matrix: Sequence[Sequence[int]] | np.ndarray,
+    out=None,
+) -> bytes | None:
     """
     Write an .mw file payload (big-endian) matching the provided MATLAB reader.
 
@@ -39,100 +46,69 @@ def write_mw(
     - radius_start_mm: float (will be stored as uint16 of mm*1000)
     - radius_end_mm: float (will be stored as uint16 of mm*1000)
     - lambdas_tenths_nm: iterable of uint16 values (wavelengths in 0.1 nm)
-    - intensity_matrix: 2D iterable radius_count x lambda_count of unsigned ints,
+    - intensity_matrix: 2D iterable or NumPy array lambda_count x radius_count of unsigned ints,
                         written with element type matching MATLAB fread '*uint' (use 32-bit here)
+    - out: optional file object or bytearray the payload is written to
 
     Returns:
-        bytes suitable to write to an .mw file.
+        bytes suitable to write to an .mw file, None if out is given.
     """
 
-    # Header
-    # uint32 magic
-    bin_data = struct.pack(">I", magic_number)
-
-    # 48-bit date/time as 6 big-endian bytes
+    # Header (100 bytes): magic, 48-bit date/time, version, cell, channel, scan, sample, speed, temperature in tenths C,
+    # w2t, seconds, radiusCount, radiusStart, radiusEnd, lambdaCount
     if not (0 <= date_time_ubit48 < (1 << 48)):
         raise ValueError("date_time_ubit48 must be a 48-bit unsigned integer")
-    bin_data += date_time_ubit48.to_bytes(6, byteorder="big", signed=False)
-
-    # uint16 version
-    bin_data += struct.pack(">H", version_number)
-
-    # uint8 cell
-    bin_data += struct.pack(">B", cell)
-
-    # 1-char channel
     if len(channel) != 1:
         raise ValueError("channel must be a single character")
-    bin_data += channel.encode("ASCII")
-
-    # uint16 scan
-    bin_data += struct.pack(">H", scan)
-
-    # 64-char sample (pad/truncate)
-    if len(sample) > 64:
-        sample = sample[:64]
-    sample_code = sample.encode() + b'\x00' * (64 - len(sample))
-    bin_data += sample_code
-
-    # uint16 speed
-    bin_data += struct.pack(">H", int(round(speed)))
-
-    # uint16 temperature in tenths C
-    bin_data += struct.pack(">H", int(round(temperature_c * 10)))
-
-    # uint32 w2t (milliseconds as given; MATLAB multiplies by 1000 on read)
-    bin_data += struct.pack(">I", int(round(w2t / 1000.0)))
-
-    # uint32 seconds
-    bin_data += struct.pack(">I", int(round(seconds)))
-
-    # uint16 radiusCount
-    bin_data += struct.pack(">H", radius_count)
-
-    # uint16 radiusStart in micrometers (mm * 1000)
-    bin_data += struct.pack(">H", int(round(radius_start * 100.0)))
-
-    # uint16 radiusEnd in micrometers (mm * 1000)
-    bin_data += struct.pack(">H", int(round(radius_end * 100.0)))
-
-    # uint16 lambdaCount
     lambda_count = len(lambdas)
-    bin_data += struct.pack(">H", lambda_count)
+    header = HEADER_STRUCT.pack(
+        magic_number,
+        date_time_ubit48.to_bytes(6, byteorder="big", signed=False),
+        version_number,
+        cell,
+        channel.encode("ASCII"),
+        scan,
+        # 64-char sample, truncated or right-padded with zeros
+        sample.encode()[:64],
+        int(round(speed)),
+        int(round(temperature_c * 10)),
+        # w2t as given; MATLAB multiplies by 1000 on read
+        int(round(w2t / 1000.0)),
+        int(round(seconds)),
+        radius_count,
+        int(round(radius_start * 100.0)),
+        int(round(radius_end * 100.0)),
+        lambda_count,
+    )
 
     # lambda array uint16 each (tenths of nm)
-    for lamb in lambdas:
-        bin_data += struct.pack(">H", int(round(lamb * 10.0)))
-
-    # After header + lambdas, MATLAB seeks to byte offset:
-    # start_byte = 100 + lambdaCount*2
-    # Ensure our header length matches 100 bytes before lambdas:
-    # 4 (magic) + 6 (date) + 2 (ver) + 1 (cell) + 1 (channel) + 2 (scan) +
-    # 64 (sample) + 2 (speed) + 2 (temp) + 4 (w2t) + 4 (seconds) +
-    # 2 (radiusCount) + 2 (radiusStart) + 2 (radiusEnd) + 2 (lambdaCount) = 98
-    # Note: The MATLAB code's offset implies 100 bytes before lambdas.
-    # To align, we add 2 bytes of reserved/padding to reach 100.
-    # This matches the seek to 100 + lambdaCount*2 for intensity.
-    # If your real format already accounts for 100, remove this padding.
-    if len(bin_data) == 98 + lambda_count * 2:
-        bin_data += b"\x00\x00"
-    elif len(bin_data) != 100 + lambda_count * 2:
-        raise ValueError(f"Unexpected header size {len(bin_data)} bytes; expected 100 before lambdas segment.")
-
-    # At this point we have 100 bytes + 2*lambda_count bytes written.
+    lambda_values = np.rint(np.asarray(lambdas, dtype=np.float64) * 10.0)
+    if lambda_values.size and (lambda_values.min() < 0 or lambda_values.max() > 0xFFFF):
+        raise ValueError("wavelengths must be in range 0..6553.5")
 
     # Intensity matrix: MATLAB used fread(..., '*uint') which defaults to uint32 here.
-    # Write as big-endian uint32 in row-major [radiusCount, lambdaCount]
+    # Written as big-endian uint32 in row-major [lambdaCount, radiusCount], starting at byte 100 + lambdaCount*2
     if len(intensity_matrix) != lambda_count:
-        raise ValueError("intensity_matrix row count must equal radius_count")
-    for row in intensity_matrix:
-        if len(row) != radius_count:
-            raise ValueError("each intensity row length must equal lambda_count")
-        for val in row:
-            val = max(val, 0.0)
-            # Ensure non-negative and fit into uint32
-            if val < 0 or val > 0xFFFFFFFF:
-                raise ValueError("intensity values must be in range 0..2^32-1")
-            bin_data += struct.pack(">I", int(val))
-
-    return bin_data
+        raise ValueError("intensity_matrix row count must equal lambda_count")
+    try:
+        matrix = np.asarray(intensity_matrix, dtype=np.float64)
+    except ValueError:
+        raise ValueError("each intensity row length must equal radius_count")
+    if matrix.size == 0:
+        matrix = matrix.reshape(lambda_count, radius_count)
+    if matrix.shape != (lambda_count, radius_count):
+        raise ValueError("each intensity row length must equal radius_count")
+    # negative values are clipped to 0, the rest has to fit into uint32
+    matrix = np.maximum(matrix, 0.0)
+    if not np.isfinite(matrix).all() or (matrix > 0xFFFFFFFF).any():
+        raise ValueError("intensity values must be in range 0..2^32-1")
+
+    parts = (header, lambda_values.astype(">u2").tobytes(), matrix.astype(">u4").tobytes())
+    if out is None:
+        return b"".join(parts)
+    for part in parts:
+        if isinstance(out, bytearray):
+            out += part
+        else:
+            out.write(part)
+    return None
@@ -1,23 +1,52 @@
 import struct
 
+import numpy as np
+
+# cell, channel, scan, set_speed, speed, temperature*10, omega2t, seconds, radius_count, radius_start*1000,
+# radius_step*10000, lambda_count (all big endian)
+HEADER_STRUCT = struct.Struct('>BcHHHhfiHHHH')
+
+
 def write_mwrs(cell: int, channel: str, scan: int, set_speed: int, speed: int, temperature: int, omegat2: float,
                seconds: int, radius_start: float, radius_step: float, lambdas: list[int],
-               radius_points: int, intensity: list[list[float]]) -> bytes:
-    """Write the mwrs file"""
+               radius_points: int, intensity: list[list[float]] | np.ndarray, out=None) -> bytes | None:
+    """Write the mwrs file
+
+    intensity is a (lambda_count, radius_points) matrix as nested lists or NumPy array. Every wavelength row is
+    shifted by its negative minimum, scaled by 10000 and truncated to unsigned 32bit integers.
+    Without out the file content is returned as bytes, otherwise it is written to out, a file object or bytearray.
+    """
     # change the format specifier to big-endian
-    bin_data = struct.pack('>BcHHHhfiHHHH', cell, channel.encode('ASCII'), scan, set_speed, speed, int(temperature *
-                                                                                                       10),
-                           omegat2,
-                           seconds, radius_points, int(radius_start * 1000), int(radius_step * 10000), len(lambdas))
+    header = HEADER_STRUCT.pack(cell, channel.encode('ASCII'), scan, set_speed, speed, int(temperature * 10), omegat2,
+                                seconds, radius_points, int(radius_start * 1000), int(radius_step * 10000),
+                                len(lambdas))
 
     # pack the wavelengths
-    for lamb in lambdas:
-        bin_data += struct.pack('>H', lamb)
+    lambdas = np.asarray(lambdas)
+    if lambdas.dtype.kind not in 'iu' and np.any(np.asarray(lambdas, dtype=np.float64) % 1 != 0):
+        raise ValueError("wavelengths must be integers")
+    lambdas = lambdas.astype(np.int64)
+    if lambdas.size and (lambdas.min() < 0 or lambdas.max() > 0xFFFF):
+        raise ValueError("wavelengths must be in range 0..65535")
 
-    # pack the intensity values
-    for intensities in intensity:
-        offset = min(intensities + [0])
-        for intens in intensities:
-            bin_data += struct.pack('>I', int((intens - offset) * 10000))
+    # pack the intensity values, every wavelength is offset by its minimum if that is negative
+    intensity = np.asarray(intensity, dtype=np.float64)
+    if intensity.size == 0 and len(lambdas) * radius_points == 0:
+        # no wavelengths or no radii, like write_mw a header only file is written
+        intensity = intensity.reshape(len(lambdas), radius_points)
+    if intensity.shape != (len(lambdas), radius_points):
+        raise ValueError(f"intensity must be a {len(lambdas)}x{radius_points} matrix, got shape {intensity.shape}")
+    offset = intensity.min(axis=1, initial=0.0, keepdims=True)
+    scaled = np.trunc((intensity - offset) * 10000)
+    if not np.isfinite(scaled).all() or (scaled > 0xFFFFFFFF).any():
+        raise ValueError("scaled intensity values must be in range 0..2^32-1")
 
-    return bin_data
+    parts = (header, lambdas.astype('>u2').tobytes(), scaled.astype('>u4').tobytes())
+    if out is None:
+        return b''.join(parts)
+    for part in parts:
+        if isinstance(out, bytearray):
+            out += part
+        else:
+            out.write(part)
+    return None
@@ -0,0 +1,86 @@
+import math
+
+import numpy as np
+
+from check_timestate import ACCELERATION_RATE, calc_acceleration, calc_omega2t
+from read_auc import read_auc_header
+from read_tmst import RECORD_DTYPE
+
+RPM2RADPS = math.pi / 30.0
+
+
+def write_tmst(filename: str, records, magic_number: str = 'USTS', major_version: int = 1, minor_version: int = 0):
+    """Write records with the fields of read_tmst.RECORD_DTYPE as tmst file in one buffer write"""
+    data = np.empty(len(records), dtype=RECORD_DTYPE)
+    for name in RECORD_DTYPE.names:
+        data[name] = records[name]
+    header = magic_number.encode('utf-8')[:4].ljust(4, b'\x00') + bytes([major_version, minor_version])
+    with open(filename, 'wb') as f:
+        f.write(header + data.tobytes())
+
+
+def synthesize_time_state(seconds, rpm, omega2t, temperature, scans=None) -> np.ndarray:
+    """Build a time state at 1 second resolution from the metadata of the scans of a run
+
+    Consecutive scans with the same set speed (rpm rounded to 100) form a speed step. The acceleration of the first
+    step is derived from the first scan with calc_acceleration, later steps start after the last scan of the previous
+    step and change speed with ACCELERATION_RATE. Within a step omega2t follows the same integral as calc_omega2t,
+    evaluated for all seconds at once. The second of the last scan of a step still belongs to that step. The scan
+    number (scans, numbered from 1 by position if not given) is set for the second of every scan, the temperature is
+    interpolated between the scans.
+    """
+    order = np.argsort(seconds, kind='stable')
+    seconds = np.asarray(seconds, dtype=np.float64)[order]
+    set_speeds = np.round(np.asarray(rpm, dtype=np.float64)[order] / 100) * 100
+    omega2t = np.asarray(omega2t, dtype=np.float64)[order]
+    temperature = np.asarray(temperature, dtype=np.float64)[order]
+
+    # first scan of every speed step
+    firsts = np.flatnonzero(np.r_[True, set_speeds[1:] != set_speeds[:-1]])
+    targets = set_speeds[firsts]
+    start_times = np.r_[0.0, seconds[firsts[1:] - 1]]
+    start_speeds = np.r_[0.0, targets[:-1]]
+    accel_rates = np.empty(len(firsts))
+    accel_rate, accel_end = calc_acceleration(targets[0], seconds[0], omega2t[0])
+    if accel_end > seconds[0]:
+        accel_rate = targets[0] / seconds[0]
+    accel_rates[0] = accel_rate if accel_rate > 0 else ACCELERATION_RATE
+    accel_rates[1:] = np.sign(targets[1:] - start_speeds[1:]) * ACCELERATION_RATE
+    with np.errstate(divide='ignore', invalid='ignore'):
+        accel_durations = np.where(accel_rates != 0, (targets - start_speeds) / accel_rates, 0.0)
+
+    # omega2t at the start of every step from the end of the previous one
+    start_omega2t = np.zeros(len(firsts))
+    for k in range(1, len(firsts)):
+        start_omega2t[k] = calc_omega2t(start_omega2t[k - 1], start_speeds[k - 1], start_times[k - 1], targets[k - 1],
+                                        start_times[k], accel_rates[k - 1] or None)
+
+    # evaluate the speed steps for every second
+    time = np.arange(int(math.ceil(seconds[-1])) + 1)
+    step = np.maximum(np.searchsorted(start_times, time, side='left') - 1, 0)
+    relative_time = time - start_times[step]
+    accel_time = np.minimum(accel_durations[step], relative_time)
+    start_speed = start_speeds[step] * RPM2RADPS
+    accel = accel_rates[step] * RPM2RADPS
+    state_omega2t = (start_omega2t[step]
+                     + start_speed ** 2 * accel_time
+                     + start_speed * accel * accel_time ** 2
+                     + accel ** 2 * accel_time ** 3 / 3.0
+                     + (targets[step] * RPM2RADPS) ** 2 * np.maximum(0.0, relative_time - accel_durations[step]))
+
+    records = np.zeros(len(time), dtype=RECORD_DTYPE)
+    records['Time'] = time
+    records['RawSpeed'] = start_speeds[step] + accel_rates[step] * accel_time
+    records['SetSpeed'] = targets[step]
+    records['Omega2T'] = state_omega2t
+    records['Temperature'] = np.interp(time, seconds, temperature)
+    records['Step'] = step + 1
+    records['Scan'][np.round(seconds).astype(np.int64)] = order + 1 if scans is None else np.asarray(scans)[order]
+    return records
+
+
+def time_state_from_auc(filename: str) -> np.ndarray:
+    """Synthesize the time state of a run from the scan headers of one of its auc files"""
+    scans = read_auc_header(filename)['scanData']
+    return synthesize_time_state([scan['seconds'] for scan in scans], [scan['rpm'] for scan in scans],
+                                 [scan['omega2t'] for scan in scans], [scan['temperature'] for scan in scans])